@@ -829,6 +829,7 @@ def update_level(level_id):
             
             # 保存更改
             PriceLevel.session.commit()
+            PriceLevel.invalidate_cache()
             
             # 返回更新后的记录
             return jsonify({
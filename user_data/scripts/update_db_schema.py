@@ -3,18 +3,13 @@
 数据库迁移脚本：为price_levels表添加confirm_close字段
 """
 import argparse
-import json
 import logging
+import re
 import sys
-import os
+from functools import lru_cache
 from pathlib import Path
 
-# 添加freqtrade目录到搜索路径
-sys.path.append(str(Path(__file__).parents[2]))
-
-from sqlalchemy import create_engine, text, Column, Integer
-from sqlalchemy.exc import SQLAlchemyError, OperationalError
-from freqtrade.persistence.models import init_db
+# sqlalchemy在函数内延迟导入，--help和参数错误时无需加载
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,62 +17,167 @@ logging.basicConfig(
 )
 logger = logging.getLogger("db_migration")
 
-def setup_db(config_file: str) -> tuple:
+# 迁移连接使用的SQLite参数。journal_mode=WAL会持久写入数据库文件，但ATRLevelSignal
+# 每次连接tradesv3.sqlite时本来就设置WAL（见ATRLevelSignal.SQLITE_PRAGMAS），这里保持一致，
+# 不会改变机器人使用的日志模式；其余参数只作用于当前连接
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
+# 迁移用到的SQL语句，查询语句的TextClause在首次使用时构建并缓存
+SQL_SQLITE_TABLE_DDL = "SELECT sql FROM sqlite_master WHERE type='table' AND name = :t"
+SQL_SQLITE_COLUMN_EXISTS = "SELECT 1 FROM pragma_table_info(:t) WHERE name = :c"
+SQL_COLUMN_EXISTS = (
+    "SELECT 1 FROM information_schema.columns WHERE table_name = :t AND column_name = :c"
+)
+
+# confirm_close的默认值必须是字面常量：SQLite对常量默认值的ADD COLUMN只修改表结构元数据，
+# 与表的行数无关；CURRENT_TIMESTAMP、表达式或NULL默认值配合NOT NULL会被拒绝或需要重建整表。
+# 确实需要非常量默认值时，应先添加可空列，分批UPDATE回填，再在低峰期重建表加上NOT NULL约束
+CONFIRM_CLOSE_DEFAULT = "0"
+SQL_ADD_CONFIRM_CLOSE = (
+    "ALTER TABLE price_levels ADD COLUMN confirm_close INTEGER NOT NULL "
+    f"DEFAULT {CONFIRM_CLOSE_DEFAULT}"
+)
+SQL_ADD_CONFIRM_CLOSE_IF_NOT_EXISTS = (
+    "ALTER TABLE price_levels ADD COLUMN IF NOT EXISTS confirm_close INTEGER NOT NULL "
+    f"DEFAULT {CONFIRM_CLOSE_DEFAULT}"
+)
+
+# 字面常量默认值：整数、小数或单引号字符串
+_CONSTANT_DEFAULT_RE = re.compile(r"^(-?\d+(\.\d+)?|'[^']*')$")
+
+def _assert_fast_add_column(default_sql: str) -> None:
+    """确保ADD COLUMN使用字面常量默认值，保持O(1)的快速路径"""
+    if not _CONSTANT_DEFAULT_RE.match(default_sql.strip()):
+        raise ValueError(
+            f"默认值 {default_sql} 不是字面常量，ADD COLUMN会被拒绝或需要重建整表；"
+            "请先添加可空列并分批回填"
+        )
+
+# 常量默认值在导入时校验一次，修改CONFIRM_CLOSE_DEFAULT出错时脚本直接无法启动
+_assert_fast_add_column(CONFIRM_CLOSE_DEFAULT)
+
+@lru_cache(maxsize=None)
+def _text(sql: str):
+    """返回缓存的TextClause，避免每次调用重复构建"""
+    from sqlalchemy import text
+    return text(sql)
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """新建SQLite连接时设置PRAGMA"""
+    cursor = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def _read_db_url(config_file: str):
+    """从配置文件读取数据库URL，安装了ijson时只流式解析到db_url为止"""
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    
+    with open(config_file, 'rb') as f:
+        if ijson is not None:
+            return next(ijson.items(f, 'db_url'), None)
+        import json
+        return json.load(f).get('db_url', None)
+
+def setup_db(config_file: str):
     """初始化数据库连接"""
+    from sqlalchemy import create_engine, event
+    
     try:
-        # 读取配置文件
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-        
         # 获取数据库URL
-        db_url = config.get('db_url', None)
+        db_url = _read_db_url(config_file)
         if not db_url:
             logger.error("配置文件中未找到数据库URL")
-            return None, None
+            return None
         
-        # 初始化数据库连接
-        init_db(db_url)
+        # 迁移只执行DDL，不需要init_db建立的ORM会话，直接创建唯一的Core引擎
+        kwargs = {'pool_pre_ping': True}
+        if db_url.startswith('sqlite'):
+            kwargs['connect_args'] = {'check_same_thread': False}
+        engine = create_engine(db_url, future=True, **kwargs)
         
-        # 创建引擎
-        engine = create_engine(db_url)
+        if db_url.startswith('sqlite'):
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
         
         logger.info(f"已连接到数据库: {db_url}")
-        return engine, config
+        return engine
     except Exception as e:
         logger.error(f"连接数据库失败: {e}")
-        return None, None
+        return None
+
+def _fast_already_migrated(engine) -> bool:
+    """只读快速检查confirm_close列是否已存在，避免打开写事务"""
+    from sqlalchemy.exc import SQLAlchemyError
+    
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'sqlite':
+                sql = conn.execute(
+                    _text(SQL_SQLITE_TABLE_DDL), {"t": 'price_levels'}
+                ).scalar()
+                return 'confirm_close' in (sql or '')
+            result = conn.execute(
+                _text(SQL_COLUMN_EXISTS), {"t": 'price_levels', "c": 'confirm_close'}
+            )
+            return result.first() is not None
+    except SQLAlchemyError as e:
+        logger.warning(f"快速检查迁移状态失败: {e}")
+        return False
 
 def check_column_exists(engine, table_name, column_name):
     """检查列是否已存在"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+    
     try:
         with engine.connect() as conn:
-            result = conn.execute(text(f"PRAGMA table_info({table_name})"))
-            columns = [row[1] for row in result]
-            return column_name in columns
+            if engine.dialect.name == 'sqlite':
+                # pragma_table_info表值函数需要SQLite 3.16+
+                if engine.dialect.server_version_info >= (3, 16):
+                    result = conn.execute(
+                        _text(SQL_SQLITE_COLUMN_EXISTS),
+                        {"t": table_name, "c": column_name},
+                    )
+                    return result.first() is not None
+                result = conn.exec_driver_sql(f"PRAGMA table_info({table_name})")
+                return any(row[1] == column_name for row in result)
+            # 其他数据库通过inspector检查，找到即停止
+            columns = inspect(conn).get_columns(table_name)
+            return any(col['name'] == column_name for col in columns)
     except SQLAlchemyError as e:
         logger.error(f"检查列时发生错误: {e}")
         return False
 
 def add_confirm_close_column(engine):
     """添加confirm_close列到price_levels表"""
+    from sqlalchemy.exc import SQLAlchemyError
+    
     try:
-        with engine.connect() as conn:
-            # 检查列是否已存在
-            if check_column_exists(engine, 'price_levels', 'confirm_close'):
-                logger.info("confirm_close列已存在，跳过添加")
-                return True
-            
-            # 添加列
-            conn.execute(text("ALTER TABLE price_levels ADD COLUMN confirm_close INTEGER NOT NULL DEFAULT 0"))
-            conn.commit()
-            logger.info("成功添加confirm_close列到price_levels表")
+        if engine.dialect.name == 'postgresql':
+            # PostgreSQL原生支持IF NOT EXISTS，无需预先检查
+            with engine.begin() as conn:
+                conn.exec_driver_sql(SQL_ADD_CONFIRM_CLOSE_IF_NOT_EXISTS)
+            logger.info("已确保price_levels表存在confirm_close列（不存在时已添加）")
             return True
-    except OperationalError as e:
-        if 'duplicate column name' in str(e).lower():
-            logger.info("列已存在，继续执行")
+        
+        # SQLite不支持ADD COLUMN IF NOT EXISTS，先检查列是否已存在
+        if check_column_exists(engine, 'price_levels', 'confirm_close'):
+            logger.info("confirm_close列已存在，跳过添加")
             return True
-        logger.error(f"添加列时发生错误: {e}")
-        return False
+        
+        # 添加列，engine.begin()在退出时自动提交
+        with engine.begin() as conn:
+            conn.exec_driver_sql(SQL_ADD_CONFIRM_CLOSE)
+        logger.info("成功添加confirm_close列到price_levels表")
+        return True
     except SQLAlchemyError as e:
         logger.error(f"添加列时发生SQL错误: {e}")
         return False
@@ -89,10 +189,14 @@ def main():
     args = parser.parse_args()
     
     # 设置数据库连接
-    engine, config = setup_db(args.config)
+    engine = setup_db(args.config)
     if not engine:
         sys.exit(1)
     
+    if _fast_already_migrated(engine):
+        logger.info("confirm_close列已存在，数据库已迁移")
+        return
+    
     # 执行迁移
     if add_confirm_close_column(engine):
         logger.info("数据库迁移成功完成")
@@ -103,4 +207,6 @@ def main():
     logger.info("请重新启动price_levels_web.py以使用新功能")
 
 if __name__ == "__main__":
+    # 添加freqtrade目录到搜索路径
+    sys.path.append(str(Path(__file__).parents[2]))
     main() 
\ No newline at end of file
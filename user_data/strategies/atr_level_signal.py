@@ -1,13 +1,22 @@
 import logging
+import atexit
 import enum
+import functools
+import json
 import os
-from typing import ClassVar, Optional, List, Dict, Any
+import threading
+import time
+from typing import ClassVar, Optional, List, Dict, Any, Tuple, Deque
+from collections import deque
 from datetime import datetime
+from operator import attrgetter
 import traceback
-import pandas as pd
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 
-from sqlalchemy import String, Float, Integer, DateTime, select, delete, create_engine
+from sqlalchemy import String, Float, Integer, DateTime, Index, bindparam, event, select, delete, insert, update, create_engine
 from sqlalchemy.orm import Mapped, mapped_column, sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import SQLAlchemyError
 
 from freqtrade.strategy import IStrategy
@@ -16,6 +25,16 @@ from freqtrade.persistence.models import init_db
 from pandas import DataFrame, Series
 import pandas_ta as ta
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the NumPy implementation is used without it
+    njit = None
+
+try:
+    import numexpr
+except ImportError:  # numexpr is optional, plain NumPy broadcasting is used without it
+    numexpr = None
+
 logger = logging.getLogger(__name__)
 
 class LevelDirection(str, enum.Enum):
@@ -27,11 +46,227 @@ class LevelDirection(str, enum.Enum):
     WICK_DOWN = "wick_down"  # 向下流动性清扫（K线下影线部分穿过价格水平）
     WICK_BOTH = "wick_both"  # 双向流动性清扫（K线上下影线部分穿过价格水平）
 
+# Signal bit lanes, shared by the level direction codes and the detection flags
+_CROSS_UP = 1
+_CROSS_DOWN = 2
+_WICK_UP = 4
+_WICK_DOWN = 8
+
+# Signals each level direction is allowed to produce
+_DIRECTION_CODES = {
+    LevelDirection.UP.value: _CROSS_UP,
+    LevelDirection.DOWN.value: _CROSS_DOWN,
+    LevelDirection.BOTH.value: _CROSS_UP | _CROSS_DOWN,
+    LevelDirection.WICK_UP.value: _WICK_UP,
+    LevelDirection.WICK_DOWN.value: _WICK_DOWN,
+    LevelDirection.WICK_BOTH.value: _WICK_UP | _WICK_DOWN,
+}
+
+def _direction_codes(directions: List[str]) -> np.ndarray:
+    """Signal bit mask allowed by each level's direction"""
+    return np.fromiter((_DIRECTION_CODES.get(d, 0) for d in directions),
+                       dtype=np.uint8, count=len(directions))
+
+def _level_arrays(levels: List[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Column vectors of (id, level, direction, confirm_close) level rows
+    :return: level ids (int32), level prices (float64), direction codes (uint8), confirm_close (bool)
+    """
+    ids, prices, directions, confirms = zip(*levels)
+    return (np.array(ids, dtype=np.int32),
+            np.array(prices, dtype=np.float64),
+            _direction_codes(directions),
+            np.array(confirms, dtype=bool))
+
+# Level signal columns and their dtypes (0/1 flags as int8)
+_LEVEL_COLUMNS = ('level_cross_up', 'level_cross_down', 'level_wick_up', 'level_wick_down',
+                  'level_id', 'level_price')
+_LEVEL_DTYPES = (np.int8, np.int8, np.int8, np.int8, np.int32, np.float64)
+
+def _init_level_columns(dataframe: DataFrame) -> DataFrame:
+    """Attach all level signal columns filled with zeros in a single assign"""
+    n = len(dataframe)
+    return dataframe.assign(**{col: np.zeros(n, dtype=dtype)
+                               for col, dtype in zip(_LEVEL_COLUMNS, _LEVEL_DTYPES)})
+
+def _shift1(values: np.ndarray) -> np.ndarray:
+    """Previous-row values (same as Series.shift(1)) built with a single slice copy"""
+    shifted = np.empty(len(values), dtype=np.float64)
+    shifted[:1] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+# Matrices from this many cells (candles x levels) are evaluated with numexpr
+_NUMEXPR_MIN_CELLS = 1_000_000
+
+# Signal bits of all candles against one level, fused into a single numexpr pass
+_LEVEL_FLAGS_EXPR = (
+    "where((cp < lv) & where(cc, c > lv, (o > lv) | (c > lv)), 1, 0)"
+    " + where((cp > lv) & where(cc, c < lv, (o < lv) | (c < lv)), 2, 0)"
+    " + where((hp < lv) & (h > lv) & (c < lv) & (o < lv), 4, 0)"
+    " + where((lp > lv) & (lo < lv) & (c > lv) & (o > lv), 8, 0)"
+)
+
+def _level_signal_flags(open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                        close: np.ndarray, close_prev: np.ndarray,
+                        high_prev: np.ndarray, low_prev: np.ndarray,
+                        level_prices: np.ndarray, dir_codes: np.ndarray,
+                        confirm_close: np.ndarray) -> np.ndarray:
+    """
+    Evaluate the crossing conditions of all levels at once via broadcasting.
+    Rows are candles, columns are levels, each cell holds the signal bits.
+    A level only produces signals if its condition holds on the last candle.
+    :return: uint8 matrix of signal bits (candles x levels)
+    """
+    n, m = close.shape[0], level_prices.shape[0]
+    if numexpr is not None and n * m >= _NUMEXPR_MIN_CELLS:
+        # 大矩阵逐个点位用numexpr分块计算，避免每个条件生成一个完整的临时矩阵
+        flags = np.empty((n, m), dtype=np.uint8)
+        env = {'o': open_, 'h': high, 'lo': low, 'c': close,
+               'cp': close_prev, 'hp': high_prev, 'lp': low_prev}
+        for j in range(m):
+            env['lv'] = level_prices[j]
+            env['cc'] = bool(confirm_close[j])
+            flags[:, j] = numexpr.evaluate(_LEVEL_FLAGS_EXPR, local_dict=env)
+        flags &= dir_codes
+        flags &= flags[-1].copy()
+        return flags
+    
+    lv = level_prices[None, :]
+    o = open_[:, None]
+    h = high[:, None]
+    lo = low[:, None]
+    c = close[:, None]
+    cp = close_prev[:, None]
+    
+    # 实体突破：收盘确认时只看收盘价，否则开盘价或收盘价穿过水平即可
+    cross_up = (cp < lv) & np.where(confirm_close, c > lv, (o > lv) | (c > lv))
+    cross_down = (cp > lv) & np.where(confirm_close, c < lv, (o < lv) | (c < lv))
+    # 影线流动性清扫：影线穿过水平但实体没有
+    wick_up = (high_prev[:, None] < lv) & (h > lv) & (c < lv) & (o < lv)
+    wick_down = (low_prev[:, None] > lv) & (lo < lv) & (c > lv) & (o > lv)
+    
+    flags = cross_up.view(np.uint8)
+    flags |= cross_down.view(np.uint8) << 1
+    flags |= wick_up.view(np.uint8) << 2
+    flags |= wick_down.view(np.uint8) << 3
+    flags &= dir_codes
+    # 只有当最后一根K线满足条件时才设置该点位的信号
+    flags &= flags[-1].copy()
+    return flags
+
+def _candle_level_flags(o, h, lo, c, cp, hp, lp, lv, code, confirm):
+    """
+    Signal bits of a single candle against a single level
+    """
+    if confirm:
+        body_up = c > lv
+        body_down = c < lv
+    else:
+        body_up = o > lv or c > lv
+        body_down = o < lv or c < lv
+    flags = 0
+    if cp < lv and body_up:
+        flags |= _CROSS_UP
+    if cp > lv and body_down:
+        flags |= _CROSS_DOWN
+    if hp < lv and h > lv and c < lv and o < lv:
+        flags |= _WICK_UP
+    if lp > lv and lo < lv and c > lv and o > lv:
+        flags |= _WICK_DOWN
+    return flags & code
+
+def _level_signals_kernel(open_, high, low, close, close_prev, high_prev, low_prev,
+                          level_prices, dir_codes, confirm_close):
+    """
+    Single pass over candles x levels without temporary matrices (compiled with numba)
+    :return: see _detect_level_signals
+    """
+    n = close.shape[0]
+    m = level_prices.shape[0]
+    last = n - 1
+    last_flags = np.empty(m, dtype=np.uint8)
+    for j in range(m):
+        last_flags[j] = _candle_level_flags(open_[last], high[last], low[last], close[last],
+                                            close_prev[last], high_prev[last], low_prev[last],
+                                            level_prices[j], dir_codes[j], confirm_close[j])
+    
+    row_flags = np.zeros(n, dtype=np.uint8)
+    level_idx = np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        for j in range(m):
+            flags = _candle_level_flags(open_[i], high[i], low[i], close[i],
+                                        close_prev[i], high_prev[i], low_prev[i],
+                                        level_prices[j], dir_codes[j], confirm_close[j])
+            flags &= last_flags[j]
+            if flags:
+                row_flags[i] |= flags
+                level_idx[i] = j
+    return row_flags, level_idx, last_flags
+
+def _true_range(high, low, close_prev):
+    """True range of a single candle"""
+    return max(high - low, abs(high - close_prev), abs(low - close_prev))
+
+def _wilder_atr(high, low, close, length):
+    """
+    Wilder's ATR in a single pass (compiled with numba), same values as talib.ATR:
+    seeded with the mean true range of candles 1..length, then smoothed as
+    atr = (atr_prev * (length - 1) + tr) / length
+    """
+    n = close.shape[0]
+    out = np.full(n, np.nan)
+    if n <= length:
+        return out
+    tr_sum = 0.0
+    for i in range(1, length + 1):
+        tr_sum += _true_range(high[i], low[i], close[i - 1])
+    atr = tr_sum / length
+    out[length] = atr
+    for i in range(length + 1, n):
+        atr = (atr * (length - 1) + _true_range(high[i], low[i], close[i - 1])) / length
+        out[i] = atr
+    return out
+
+if njit is not None:
+    _candle_level_flags = njit(cache=True)(_candle_level_flags)
+    _level_signals_kernel = njit(cache=True)(_level_signals_kernel)
+    _true_range = njit(cache=True)(_true_range)
+    _wilder_atr = njit(cache=True)(_wilder_atr)
+
+def _detect_level_signals(open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                          close: np.ndarray, close_prev: np.ndarray,
+                          high_prev: np.ndarray, low_prev: np.ndarray,
+                          level_prices: np.ndarray, dir_codes: np.ndarray,
+                          confirm_close: np.ndarray):
+    """
+    Detect level crossing signals, using the numba kernel when available
+    :return: signal bits per candle (OR over all levels),
+             index of the triggering level per candle (-1 if none; the last level wins),
+             signal bits of each level on the last candle
+    """
+    if njit is not None:
+        return _level_signals_kernel(open_, high, low, close, close_prev, high_prev, low_prev,
+                                     level_prices, dir_codes, confirm_close)
+    
+    flags = _level_signal_flags(open_, high, low, close, close_prev, high_prev, low_prev,
+                                level_prices, dir_codes, confirm_close)
+    hits = flags != 0
+    # 多个点位在同一根K线触发时，与逐个点位写入一致，保留最后一个点位
+    # （点位按id排序传入，即保留最后添加的点位）
+    last_hit = hits.shape[1] - 1 - hits[:, ::-1].argmax(axis=1)
+    level_idx = np.where(hits.any(axis=1), last_hit, -1)
+    return np.bitwise_or.reduce(flags, axis=1), level_idx, flags[-1]
+
 class PriceLevel(ModelBase):
     """
     Price level database model for level crossing detection
     """
     __tablename__ = "price_levels"
+    __table_args__ = (
+        # Serves get_levels(pair) and the level range scan of get_level_vectors_in_range
+        Index("ix_price_levels_pair_active_level", "pair", "active", "level"),
+    )
     session: ClassVar[SessionType]
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -42,22 +277,118 @@ class PriceLevel(ModelBase):
     active: Mapped[bool] = mapped_column(Integer, nullable=False, default=1)  # 1=active, 0=inactive
     confirm_close: Mapped[bool] = mapped_column(Integer, nullable=False, default=0)  # 1=require close confirmation, 0=trigger on cross
 
+    # In-process caches of active levels: pair (None = all pairs) -> (timestamp, levels)
+    # Levels may also be edited by another process (web UI), so entries expire after the TTL
+    LEVELS_CACHE_TTL: ClassVar[float] = 60.0
+    _levels_cache: ClassVar[Dict[Optional[str], tuple]] = {}
+    # pair -> (timestamp, lo, hi, rows, level vectors) of the last range query
+    _level_range_cache: ClassVar[Dict[Optional[str], tuple]] = {}
+    # Relative margin added around the queried price range
+    LEVEL_RANGE_MARGIN: ClassVar[float] = 0.01
+
+    @classmethod
+    def invalidate_cache(cls, pair: Optional[str] = None) -> None:
+        """
+        Drop cached levels for a pair (and the all-pairs entry), or everything if pair is None
+        """
+        for cache in (cls._levels_cache, cls._level_range_cache):
+            if pair is None:
+                cache.clear()
+            else:
+                cache.pop(pair, None)
+                cache.pop(None, None)
+
+    @classmethod
+    def _get_cached(cls, cache: Dict[Optional[str], tuple], pair: Optional[str]) -> Optional[list]:
+        """
+        Return the cached entry for pair if it is still within the TTL
+        """
+        cached = cache.get(pair)
+        if cached is not None and time.monotonic() - cached[0] < cls.LEVELS_CACHE_TTL:
+            return cached[1]
+        return None
+
+    @classmethod
+    def get_cached_range(cls, pair: str, lo: float, hi: float) -> Optional[Tuple[List[Any], Optional[tuple]]]:
+        """
+        Return the cached (rows, vectors) of get_level_vectors_in_range if a fresh
+        cached window covers [lo, hi], otherwise None
+        """
+        cached = cls._level_range_cache.get(pair)
+        if (cached is not None and time.monotonic() - cached[0] < cls.LEVELS_CACHE_TTL
+                and cached[1] <= lo and hi <= cached[2]):
+            return cached[3], cached[4]
+        return None
+
+    @classmethod
+    def prefetch_level_vectors(cls, pair: str, lo: float, hi: float) -> None:
+        """
+        Warm the range cache of get_level_vectors_in_range from a worker thread,
+        releasing the thread's scoped session afterwards
+        """
+        try:
+            cls.get_level_vectors_in_range(pair, lo, hi)
+        finally:
+            PriceLevel.session.remove()
+
+    @classmethod
+    def get_level_vectors_in_range(cls, pair: str, lo: float, hi: float) -> Tuple[List[Any], Optional[tuple]]:
+        """
+        Get (id, level, direction, confirm_close) rows of the active levels of a pair
+        that lie within [lo, hi] (plus LEVEL_RANGE_MARGIN), filtered in SQL, together with
+        their _level_arrays() vectors (None if there are no levels).
+        The widened window is cached and reused while later ranges stay inside it,
+        so the vectors are not rebuilt every candle.
+        """
+        try:
+            cached = cls.get_cached_range(pair, lo, hi)
+            if cached is not None:
+                return cached
+            
+            # Ensure we have a valid session
+            if not hasattr(cls, 'session') or cls.session is None:
+                logger.warning("Database session not initialized. Attempting to reconnect...")
+                ATRLevelSignal.init_db_session()
+            
+            lo *= 1 - cls.LEVEL_RANGE_MARGIN
+            hi *= 1 + cls.LEVEL_RANGE_MARGIN
+            rows = PriceLevel.session.execute(
+                _GET_LEVEL_ROWS_IN_RANGE_STMT, {"pair": pair, "lo": lo, "hi": hi}
+            ).all()
+            vectors = _level_arrays(rows) if rows else None
+            cls._level_range_cache[pair] = (time.monotonic(), lo, hi, rows, vectors)
+            return rows, vectors
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in get_level_vectors_in_range: {e}")
+            return [], None
+        except Exception as e:
+            logger.error(f"Error in get_level_vectors_in_range: {e}")
+            return [], None
+
     @classmethod
     def get_levels(cls, pair: Optional[str] = None) -> List["PriceLevel"]:
         """
         Get all active price levels for a specific pair or all pairs
         """
         try:
+            levels = cls._get_cached(cls._levels_cache, pair)
+            if levels is not None:
+                return levels
+            
             # Ensure we have a valid session
             if not hasattr(cls, 'session') or cls.session is None:
                 logger.warning("Database session not initialized. Attempting to reconnect...")
                 ATRLevelSignal.init_db_session()
                 
-            filters = [PriceLevel.active == 1]
             if pair:
-                filters.append(PriceLevel.pair == pair)
-            
-            return PriceLevel.session.scalars(select(PriceLevel).filter(*filters)).all()
+                levels = list(PriceLevel.session.scalars(_GET_LEVELS_STMT, {"pair": pair}).all())
+            else:
+                levels = list(PriceLevel.session.scalars(_GET_ALL_LEVELS_STMT).all())
+            # Detach the cached objects so later commits don't expire them and trigger reloads
+            for level in levels:
+                PriceLevel.session.expunge(level)
+            cls._levels_cache[pair] = (time.monotonic(), levels)
+            return levels
         except SQLAlchemyError as e:
             logger.error(f"Database error in get_levels: {e}")
             return []
@@ -92,6 +423,7 @@ class PriceLevel(ModelBase):
             )
             PriceLevel.session.add(price_level)
             PriceLevel.session.commit()
+            cls.invalidate_cache(pair)
             return price_level
         except SQLAlchemyError as e:
             logger.error(f"Database error in add_level: {e}")
@@ -115,6 +447,7 @@ class PriceLevel(ModelBase):
                 
             PriceLevel.session.execute(delete(PriceLevel).where(PriceLevel.id == level_id))
             PriceLevel.session.commit()
+            cls.invalidate_cache()
         except SQLAlchemyError as e:
             logger.error(f"Database error in delete_level: {e}")
             PriceLevel.session.rollback()
@@ -135,10 +468,11 @@ class PriceLevel(ModelBase):
                 logger.warning("Database session not initialized. Attempting to reconnect...")
                 ATRLevelSignal.init_db_session()
                 
-            level = PriceLevel.session.get(PriceLevel, level_id)
-            if level:
-                level.active = 0
-                PriceLevel.session.commit()
+            PriceLevel.session.execute(
+                update(PriceLevel).where(PriceLevel.id == level_id).values(active=0)
+            )
+            PriceLevel.session.commit()
+            cls.invalidate_cache()
         except SQLAlchemyError as e:
             logger.error(f"Database error in deactivate_level: {e}")
             PriceLevel.session.rollback()
@@ -151,6 +485,11 @@ class SignalHistory(ModelBase):
     Signal history database model for tracking level crossing signals
     """
     __tablename__ = "signal_history"
+    __table_args__ = (
+        # Serve get_signals filtered by pair (and signal type), newest first
+        Index("ix_signal_history_pair_created", "pair", "created_at"),
+        Index("ix_signal_history_pair_type_created", "pair", "signal_type", "created_at"),
+    )
     session: ClassVar[SessionType]
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -163,6 +502,18 @@ class SignalHistory(ModelBase):
     atr_value: Mapped[float] = mapped_column(Float, nullable=True)  # ATR value, null for level cross signals
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
     
+    # Write-behind buffer: signals are queued on the strategy thread and inserted
+    # in batches by a background writer every SIGNAL_FLUSH_INTERVAL seconds
+    # (or as soon as SIGNAL_FLUSH_BATCH rows are waiting). At most SIGNAL_QUEUE_MAX
+    # rows are buffered, so a stalled writer cannot grow the queue without limit
+    SIGNAL_FLUSH_INTERVAL: ClassVar[float] = 2.0
+    SIGNAL_FLUSH_BATCH: ClassVar[int] = 32
+    SIGNAL_QUEUE_MAX: ClassVar[int] = 1024
+    _signal_queue: ClassVar[Deque[Dict[str, Any]]] = deque()
+    _signal_queue_lock: ClassVar[threading.Lock] = threading.Lock()
+    _signal_flush_event: ClassVar[threading.Event] = threading.Event()
+    _signal_writer: ClassVar[Optional[threading.Thread]] = None
+    
     @classmethod
     def add_signal(cls, pair: str, signal_type: str, prev_price: float, current_price: float, 
                    level_id: Optional[int] = None, level_price: Optional[float] = None, 
@@ -185,19 +536,21 @@ class SignalHistory(ModelBase):
                 logger.warning("Database session not initialized. Attempting to reconnect...")
                 ATRLevelSignal.init_db_session()
                 
-            signal = SignalHistory(
-                pair=pair,
-                signal_type=signal_type,
-                level_id=level_id,
-                level_price=level_price,
-                prev_price=prev_price,
-                current_price=current_price,
-                atr_value=atr_value,
-                created_at=datetime.now()
-            )
-            SignalHistory.session.add(signal)
+            params = {
+                "pair": pair,
+                "signal_type": signal_type,
+                "level_id": level_id,
+                "level_price": level_price,
+                "prev_price": prev_price,
+                "current_price": current_price,
+                "atr_value": atr_value,
+                "created_at": datetime.now(),
+            }
+            # Prebuilt Core INSERT instead of the ORM unit of work; the returned
+            # object is not attached to the session
+            result = SignalHistory.session.execute(_INSERT_SIGNAL_STMT, params)
             SignalHistory.session.commit()
-            return signal
+            return SignalHistory(id=result.inserted_primary_key[0], **params)
         except SQLAlchemyError as e:
             logger.error(f"Database error in add_signal: {e}")
             SignalHistory.session.rollback()
@@ -207,6 +560,115 @@ class SignalHistory(ModelBase):
             SignalHistory.session.rollback()
             raise
     
+    @classmethod
+    def add_signals(cls, rows: List[Dict[str, Any]]) -> None:
+        """
+        Add multiple signals to history in a single executemany INSERT
+        
+        Args:
+            rows: List of dictionaries with the same keys as the add_signal arguments.
+                  created_at defaults to the current time if missing.
+        """
+        if not rows:
+            return
+        try:
+            # Ensure we have a valid session
+            if not hasattr(cls, 'session') or cls.session is None:
+                logger.warning("Database session not initialized. Attempting to reconnect...")
+                ATRLevelSignal.init_db_session()
+            
+            now = datetime.now()
+            params = [
+                {
+                    "pair": row["pair"],
+                    "signal_type": row["signal_type"],
+                    "level_id": row.get("level_id"),
+                    "level_price": row.get("level_price"),
+                    "prev_price": row["prev_price"],
+                    "current_price": row["current_price"],
+                    "atr_value": row.get("atr_value"),
+                    "created_at": row.get("created_at") or now,
+                }
+                for row in rows
+            ]
+            SignalHistory.session.execute(_INSERT_SIGNAL_STMT, params)
+            SignalHistory.session.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in add_signals: {e}")
+            SignalHistory.session.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"Error in add_signals: {e}")
+            SignalHistory.session.rollback()
+            raise
+    
+    @classmethod
+    def queue_signal(cls, **fields: Any) -> None:
+        """
+        Queue a signal for the background writer instead of inserting it right away
+        
+        Without a running writer (start_signal_writer was never reached or the thread died)
+        the signal is inserted synchronously. If SIGNAL_QUEUE_MAX signals are already
+        waiting, the new one is dropped and logged.
+        
+        Args:
+            fields: Same keyword arguments as add_signal. created_at is taken at queue time.
+        """
+        fields.setdefault("created_at", datetime.now())
+        writer = cls._signal_writer
+        if writer is None or not writer.is_alive():
+            try:
+                cls.add_signals([fields])
+            except Exception as e:
+                logger.error(f"Failed to write signal without background writer: {e}")
+            return
+        
+        with cls._signal_queue_lock:
+            queued = len(cls._signal_queue)
+            if queued < cls.SIGNAL_QUEUE_MAX:
+                cls._signal_queue.append(fields)
+                queued += 1
+            else:
+                logger.error(f"Signal queue full ({queued} waiting), dropping "
+                             f"{fields.get('signal_type')} signal for {fields.get('pair')}")
+        if queued >= cls.SIGNAL_FLUSH_BATCH:
+            cls._signal_flush_event.set()
+    
+    @classmethod
+    def flush_signal_queue(cls) -> None:
+        """
+        Insert all queued signals with a single add_signals call
+        """
+        with cls._signal_queue_lock:
+            if not cls._signal_queue:
+                return
+            rows = list(cls._signal_queue)
+            cls._signal_queue.clear()
+        try:
+            cls.add_signals(rows)
+            logger.debug(f"Flushed {len(rows)} queued signals to history")
+        except Exception as e:
+            logger.error(f"Failed to flush {len(rows)} queued signals: {e}")
+    
+    @classmethod
+    def start_signal_writer(cls) -> None:
+        """
+        Start the background writer thread once; queued signals are also flushed at exit
+        """
+        if cls._signal_writer is not None and cls._signal_writer.is_alive():
+            return
+        
+        def _run() -> None:
+            while True:
+                cls._signal_flush_event.wait(cls.SIGNAL_FLUSH_INTERVAL)
+                cls._signal_flush_event.clear()
+                cls.flush_signal_queue()
+        
+        if cls._signal_writer is None:
+            atexit.register(cls.flush_signal_queue)
+        cls._signal_writer = threading.Thread(target=_run, name="signal-history-writer", daemon=True)
+        cls._signal_writer.start()
+    
     @classmethod
     def get_signals(cls, pair: Optional[str] = None, signal_type: Optional[str] = None, 
                     start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, 
@@ -259,6 +721,39 @@ class SignalHistory(ModelBase):
             logger.error(f"Error in get_signals: {e}")
             return []
 
+# Statements built once at import instead of on every call
+_GET_ALL_LEVELS_STMT = select(PriceLevel).where(PriceLevel.active == 1)
+_GET_LEVELS_STMT = _GET_ALL_LEVELS_STMT.where(PriceLevel.pair == bindparam("pair"))
+_GET_LEVEL_ROWS_IN_RANGE_STMT = select(
+    PriceLevel.id, PriceLevel.level, PriceLevel.direction, PriceLevel.confirm_close
+).where(
+    PriceLevel.active == 1,
+    PriceLevel.pair == bindparam("pair"),
+    PriceLevel.level.between(bindparam("lo"), bindparam("hi")),
+).order_by(PriceLevel.id)  # id order like get_levels: without it the index would return rows by price
+_INSERT_SIGNAL_STMT = insert(SignalHistory.__table__)  # Core insert, bypasses the ORM unit of work
+
+# Plain fields copied into the API dicts of get_price_levels/get_signal_history
+_LEVEL_DICT_FIELDS = ('id', 'pair', 'level', 'direction')
+_get_level_fields = attrgetter(*_LEVEL_DICT_FIELDS)
+_SIGNAL_DICT_FIELDS = ('id', 'pair', 'signal_type', 'level_id', 'level_price',
+                       'prev_price', 'current_price', 'atr_value')
+_get_signal_fields = attrgetter(*_SIGNAL_DICT_FIELDS)
+
+@functools.lru_cache(maxsize=1)
+def _load_db_url() -> str:
+    """Read db_url from user_data/config.json once, falling back to the default SQLite path"""
+    db_url = None
+    config_file = os.path.join('user_data', 'config.json')
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            db_url = json.load(f).get('db_url')
+    if not db_url:
+        db_path = os.path.join('user_data', 'tradesv3.sqlite')
+        db_url = f'sqlite:///{db_path}'
+        logger.info(f"Using default database path: {db_path}")
+    return db_url
+
 class ATRLevelSignal(IStrategy):
     # Strategy configuration
     timeframe = '15m'  # Set timeframe to 15 minutes
@@ -269,32 +764,88 @@ class ATRLevelSignal(IStrategy):
     # Level crossing configuration
     check_level_crossing = True  # Enable level crossing detection
     
+    # Run modes with level detection and Telegram notifications
+    LIVE_RUNMODES: ClassVar[frozenset] = frozenset(('live', 'dry_run'))
+    
+    # Shared thread pool prefetching the levels of all pairs in bot_loop_start
+    LEVEL_PREFETCH_WORKERS: ClassVar[int] = min(8, os.cpu_count() or 1)
+    _prefetch_executor: ClassVar[Optional[ThreadPoolExecutor]] = None
+    
     # Database configuration
     db_initialized = False
     db_url = None
     
+    # Level signals in notification priority order: (column / stored signal type, title, detail label)
+    _LEVEL_SIGNAL_TABLE: ClassVar[tuple] = (
+        ('level_cross_up', "🔼 Level Cross UP", "价格穿越上升点位"),
+        ('level_cross_down', "🔽 Level Cross DOWN", "价格穿越下降点位"),
+        ('level_wick_up', "🔝 Wick UP Liquidity Sweep", "上影线扫动流动性"),
+        ('level_wick_down', "🔻 Wick DOWN Liquidity Sweep", "下影线扫动流动性"),
+    )
+    
+    # Telegram message: title, pair, timeframe, signal details, ATR, previous close, close
+    _MSG_TEMPLATE: ClassVar[str] = (
+        "%s on %s (%s)\n"
+        "%s\n"
+        "▫ 实际ATR: %.6f\n"
+        "▫ 前一价格: %.6f\n"
+        "▫ 当前价格: %.6f"
+    )
+    
+    # SQLite tuning: WAL lets readers (web UI, get_levels) run alongside signal writes,
+    # synchronous=NORMAL avoids an fsync per commit. journal_mode is persisted in the
+    # database file, so update_db_schema.py sets the same WAL mode on this file.
+    SQLITE_PRAGMAS: ClassVar[tuple] = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+    )
+    
+    @staticmethod
+    def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        for pragma in ATRLevelSignal.SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+    
+    @staticmethod
+    def _engine_kwargs(db_url: str) -> Dict[str, Any]:
+        """
+        Connection pool settings for the given database URL
+        """
+        if db_url == 'sqlite://':
+            # In-memory database must share a single connection
+            return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        if db_url.startswith('sqlite'):
+            # Take care of thread ownership, same as freqtrade's init_db
+            return {'connect_args': {'check_same_thread': False}}
+        # Remote databases: keep warm connections for many pairs and drop stale ones
+        return {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_pre_ping': True,
+            'pool_recycle': 3600,
+        }
+    
     @staticmethod
     def init_db_session():
         """Initialize database session for PriceLevel model"""
         try:
-            # Try to get database URL from config or use default
-            config_file = os.path.join('user_data', 'config.json')
-            if os.path.exists(config_file):
-                import json
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    ATRLevelSignal.db_url = config.get('db_url')
-            
-            # If no config found, use default SQLite path
-            if not ATRLevelSignal.db_url:
-                db_path = os.path.join('user_data', 'tradesv3.sqlite')
-                ATRLevelSignal.db_url = f'sqlite:///{db_path}'
-                logger.info(f"Using default database path: {db_path}")
+            # Get database URL from config or use default (config.json is only read once)
+            ATRLevelSignal.db_url = _load_db_url()
             
             # Initialize database
-            engine = create_engine(ATRLevelSignal.db_url)
+            engine = create_engine(ATRLevelSignal.db_url, **ATRLevelSignal._engine_kwargs(ATRLevelSignal.db_url))
+            if ATRLevelSignal.db_url.startswith('sqlite'):
+                event.listen(engine, 'connect', ATRLevelSignal._set_sqlite_pragmas)
             # Create tables if they don't exist
             ModelBase.metadata.create_all(engine)
+            # create_all skips existing tables, so add the composite indexes to older databases
+            for table in (PriceLevel.__table__, SignalHistory.__table__):
+                for index in table.indexes:
+                    index.create(engine, checkfirst=True)
             # Create scoped session factory
             session_factory = sessionmaker(bind=engine)
             session = scoped_session(session_factory)
@@ -307,6 +858,7 @@ class ATRLevelSignal(IStrategy):
             logger.info(f"Database session created and assigned to models")
             
             ATRLevelSignal.db_initialized = True
+            SignalHistory.start_signal_writer()
             
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
@@ -320,296 +872,222 @@ class ATRLevelSignal(IStrategy):
         # Initialize database session if not already initialized
         if not ATRLevelSignal.db_initialized:
             ATRLevelSignal.init_db_session()
+        
+        # dp is attached after construction, so the runmode checks are resolved on first use
+        self._level_check_enabled: Optional[bool] = None
+        self._notify_live: Optional[bool] = None
+        # pair -> pending level prefetch submitted in bot_loop_start
+        self._level_prefetch: Dict[str, Future] = {}
+    
+    def _resolve_level_check_enabled(self) -> bool:
+        """Level crossing detection is only active in live/dry run mode"""
+        return bool(
+            self.check_level_crossing
+            and self.dp
+            and hasattr(self.dp, 'runmode')
+            and self.dp.runmode.value in self.LIVE_RUNMODES
+        )
+    
+    def bot_loop_start(self, current_time: datetime, **kwargs) -> None:
+        """
+        Prefetch the price levels of all whitelisted pairs in parallel, so the
+        database round-trips overlap instead of running once per pair in
+        populate_indicators (which only waits for the cached result)
+        """
+        if self._level_check_enabled is None:
+            self._level_check_enabled = self._resolve_level_check_enabled()
+        if not self._level_check_enabled or not ATRLevelSignal.db_initialized:
+            return
+        
+        if ATRLevelSignal._prefetch_executor is None:
+            ATRLevelSignal._prefetch_executor = ThreadPoolExecutor(
+                max_workers=self.LEVEL_PREFETCH_WORKERS, thread_name_prefix="level-prefetch"
+            )
+        for pair in self.dp.current_whitelist():
+            # The previous prefetch of this pair is still running
+            pending = self._level_prefetch.get(pair)
+            if pending is not None and not pending.done():
+                continue
+            # copy=False: only the last two candles are read
+            candles = self.dp.ohlcv(pair, self.timeframe, copy=False)
+            if len(candles) < 2:
+                continue
+            # Same window populate_indicators queries: the range of the last two candles
+            lo = float(candles['low'].iloc[-2:].min())
+            hi = float(candles['high'].iloc[-2:].max())
+            # bot_loop_start runs every iteration: only query again once a new candle
+            # leaves the cached window or the cache entry has expired
+            if PriceLevel.get_cached_range(pair, lo, hi) is not None:
+                continue
+            self._level_prefetch[pair] = ATRLevelSignal._prefetch_executor.submit(
+                PriceLevel.prefetch_level_vectors, pair, lo, hi
+            )
     
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         # Calculate ATR indicator
-        dataframe['atr'] = ta.atr(
-            high=dataframe['high'],
-            low=dataframe['low'],
-            close=dataframe['close'],
-            length=self.atr_length
-        )
+        if njit is not None:
+            # numba可用时直接在ndarray上单次遍历计算Wilder ATR
+            dataframe['atr'] = _wilder_atr(
+                dataframe['high'].to_numpy(dtype=np.float64),
+                dataframe['low'].to_numpy(dtype=np.float64),
+                dataframe['close'].to_numpy(dtype=np.float64),
+                int(self.atr_length)
+            )
+        else:
+            dataframe['atr'] = ta.atr(
+                high=dataframe['high'],
+                low=dataframe['low'],
+                close=dataframe['close'],
+                length=self.atr_length
+            )
         # Add previous close price calculation
-        dataframe['close_prev'] = dataframe['close'].shift(1)
+        dataframe['close_prev'] = _shift1(dataframe['close'].to_numpy())
         # Add previous ATR calculation
-        dataframe['atr_prev'] = dataframe['atr'].shift(1)
+        dataframe['atr_prev'] = _shift1(dataframe['atr'].to_numpy())
         
-        # Add level crossing detection
-        if self.check_level_crossing and self.dp and hasattr(self.dp, 'runmode'):
-            # Only check for level crossing in live/dry run mode
-            if self.dp.runmode.value in ('live', 'dry_run'):
-                pair = metadata['pair']
-                # Get active price levels for this pair
-                try:
-                    # Ensure database is initialized
-                    if not ATRLevelSignal.db_initialized:
-                        ATRLevelSignal.init_db_session()
-                    
-                    levels = PriceLevel.get_levels(pair)
-                    logger.debug(f"Found {len(levels)} active price levels for {pair}")
-                    
-                    # Initialize level crossing columns
-                    dataframe['level_cross_up'] = 0
-                    dataframe['level_cross_down'] = 0
-                    dataframe['level_wick_up'] = 0  # 新增：上影线流动性清扫信号
-                    dataframe['level_wick_down'] = 0  # 新增：下影线流动性清扫信号
-                    dataframe['level_id'] = 0  # Store the level ID for reference
-                    dataframe['level_price'] = 0.0  # Store the level price for reference
-                    
-                    # Check each level for crossing
-                    for level in levels:
-                        level_price = level.level
-                        level_direction = level.direction
-                        require_close_confirm = bool(level.confirm_close)
-                        
-                        # 添加调试日志
-                        last_candle_index = len(dataframe) - 1
-                        if last_candle_index >= 0:
-                            last_candle = dataframe.iloc[last_candle_index]
-                            prev_candle = dataframe.iloc[last_candle_index-1] if last_candle_index > 0 else None
-                            
-                            logger.info(f"===== 调试信息 - {pair} - 价格水平: {level_price} =====")
-                            logger.info(f"方向: {level_direction}, 需要收盘确认: {require_close_confirm}")
-                            
-                            if prev_candle is not None:
-                                logger.info(f"上一根K线 - 开盘: {prev_candle['open']}, 收盘: {prev_candle['close']}, 最高: {prev_candle['high']}, 最低: {prev_candle['low']}")
-                            
-                            logger.info(f"当前K线 - 开盘: {last_candle['open']}, 收盘: {last_candle['close']}, 最高: {last_candle['high']}, 最低: {last_candle['low']}")
-                        
-                        # 检测实体向上突破（价格从下方穿过水平）
-                        if level_direction in [LevelDirection.UP, LevelDirection.BOTH]:
-                            if require_close_confirm:
-                                # 只有当K线收盘价高于水平时才触发
-                                cross_up = (dataframe['close_prev'] < level_price) & (dataframe['close'] > level_price)
-                                
-                                # 添加调试日志
-                                if last_candle_index >= 0 and prev_candle is not None:
-                                    condition1 = prev_candle['close'] < level_price
-                                    condition2 = last_candle['close'] > level_price
-                                    final_condition = condition1 and condition2
-                                    logger.info(f"向上突破(收盘确认) - 条件1(上一收盘<水平): {condition1}, 条件2(当前收盘>水平): {condition2}, 最终结果: {final_condition}")
-                                    
-                                    # 检查cross_up的值
-                                    has_cross_up = cross_up.any() if isinstance(cross_up, pd.Series) else bool(cross_up)
-                                    logger.info(f"cross_up.any()的值: {has_cross_up}")
-                                    
-                                    # 强制检查最后一根K线的条件
-                                    last_candle_condition = final_condition
-                                    
-                                    # 只有当最后一根K线满足条件时才设置信号
-                                    if last_candle_condition:
-                                        logger.info(f"UP CROSS detected for {pair} at level {level_price} (ID: {level.id})")
-                                        # 只对满足条件的K线设置信号
-                                        cross_up_indices = cross_up if isinstance(cross_up, pd.Series) else pd.Series([cross_up], index=[last_candle_index])
-                                        dataframe.loc[cross_up_indices, 'level_cross_up'] = 1
-                                        dataframe.loc[cross_up_indices, 'level_id'] = level.id
-                                        dataframe.loc[cross_up_indices, 'level_price'] = level_price
-                            else:
-                                # 当K线实体任何部分穿过水平时触发（开盘价或收盘价）
-                                cross_up = (dataframe['close_prev'] < level_price) & (
-                                    (dataframe['open'] > level_price) | (dataframe['close'] > level_price)
-                                )
-                                
-                                # 添加调试日志
-                                if last_candle_index >= 0 and prev_candle is not None:
-                                    condition1 = prev_candle['close'] < level_price
-                                    condition2 = last_candle['open'] > level_price
-                                    condition3 = last_candle['close'] > level_price
-                                    final_condition = condition1 and (condition2 or condition3)
-                                    logger.info(f"向上突破(非收盘确认) - 条件1(上一收盘<水平): {condition1}, 条件2(当前开盘>水平): {condition2}, 条件3(当前收盘>水平): {condition3}, 最终结果: {final_condition}")
-                                    
-                                    # 检查cross_up的值
-                                    has_cross_up = cross_up.any() if isinstance(cross_up, pd.Series) else bool(cross_up)
-                                    logger.info(f"cross_up.any()的值: {has_cross_up}")
-                                    
-                                    # 强制检查最后一根K线的条件
-                                    last_candle_condition = condition1 and (condition2 or condition3)
-                                    
-                                    # 只有当最后一根K线满足条件时才设置信号
-                                    if last_candle_condition:
-                                        logger.info(f"UP CROSS detected for {pair} at level {level_price} (ID: {level.id})")
-                                        # 只对满足条件的K线设置信号
-                                        cross_up_indices = cross_up if isinstance(cross_up, pd.Series) else pd.Series([cross_up], index=[last_candle_index])
-                                        dataframe.loc[cross_up_indices, 'level_cross_up'] = 1
-                                        dataframe.loc[cross_up_indices, 'level_id'] = level.id
-                                        dataframe.loc[cross_up_indices, 'level_price'] = level_price
-                        
-                        # 检测实体向下突破（价格从上方穿过水平）
-                        if level_direction in [LevelDirection.DOWN, LevelDirection.BOTH]:
-                            if require_close_confirm:
-                                # 只有当K线收盘价低于水平时才触发
-                                cross_down = (dataframe['close_prev'] > level_price) & (dataframe['close'] < level_price)
-                                
-                                # 添加调试日志
-                                if last_candle_index >= 0 and prev_candle is not None:
-                                    condition1 = prev_candle['close'] > level_price
-                                    condition2 = last_candle['close'] < level_price
-                                    final_condition = condition1 and condition2
-                                    logger.info(f"向下突破(收盘确认) - 条件1(上一收盘>水平): {condition1}, 条件2(当前收盘<水平): {condition2}, 最终结果: {final_condition}")
-                                    
-                                    # 检查cross_down的值
-                                    has_cross_down = cross_down.any() if isinstance(cross_down, pd.Series) else bool(cross_down)
-                                    logger.info(f"cross_down.any()的值: {has_cross_down}")
-                                    
-                                    # 强制检查最后一根K线的条件
-                                    last_candle_condition = final_condition
-                                    
-                                    # 只有当最后一根K线满足条件时才设置信号
-                                    if last_candle_condition:
-                                        logger.info(f"DOWN CROSS detected for {pair} at level {level_price} (ID: {level.id})")
-                                        # 只对满足条件的K线设置信号
-                                        cross_down_indices = cross_down if isinstance(cross_down, pd.Series) else pd.Series([cross_down], index=[last_candle_index])
-                                        dataframe.loc[cross_down_indices, 'level_cross_down'] = 1
-                                        dataframe.loc[cross_down_indices, 'level_id'] = level.id
-                                        dataframe.loc[cross_down_indices, 'level_price'] = level_price
-                            else:
-                                # 当K线实体任何部分穿过水平时触发（开盘价或收盘价）
-                                cross_down = (dataframe['close_prev'] > level_price) & (
-                                    (dataframe['open'] < level_price) | (dataframe['close'] < level_price)
-                                )
-                                
-                                # 添加调试日志
-                                if last_candle_index >= 0 and prev_candle is not None:
-                                    condition1 = prev_candle['close'] > level_price
-                                    condition2 = last_candle['open'] < level_price
-                                    condition3 = last_candle['close'] < level_price
-                                    final_condition = condition1 and (condition2 or condition3)
-                                    logger.info(f"向下突破(非收盘确认) - 条件1(上一收盘>水平): {condition1}, 条件2(当前开盘<水平): {condition2}, 条件3(当前收盘<水平): {condition3}, 最终结果: {final_condition}")
-                                    
-                                    # 检查cross_down的值
-                                    has_cross_down = cross_down.any() if isinstance(cross_down, pd.Series) else bool(cross_down)
-                                    logger.info(f"cross_down.any()的值: {has_cross_down}")
-                                    
-                                    # 强制检查最后一根K线的条件
-                                    last_candle_condition = condition1 and (condition2 or condition3)
-                                    
-                                    # 只有当最后一根K线满足条件时才设置信号
-                                    if last_candle_condition:
-                                        logger.info(f"DOWN CROSS detected for {pair} at level {level_price} (ID: {level.id})")
-                                        # 只对满足条件的K线设置信号
-                                        cross_down_indices = cross_down if isinstance(cross_down, pd.Series) else pd.Series([cross_down], index=[last_candle_index])
-                                        dataframe.loc[cross_down_indices, 'level_cross_down'] = 1
-                                        dataframe.loc[cross_down_indices, 'level_id'] = level.id
-                                        dataframe.loc[cross_down_indices, 'level_price'] = level_price
-                            
-                        # 检测上影线流动性清扫（上影线穿过水平但实体没有）
-                        if level_direction in [LevelDirection.WICK_UP, LevelDirection.WICK_BOTH]:
-                            # 修正：上影线穿过水平但实体保持在水平下方
-                            # 确保上一根K线的高点低于水平，当前K线的高点高于水平，而且当前K线的开盘和收盘都低于水平
-                            wick_up = (dataframe['high'].shift(1) < level_price) & (dataframe['high'] > level_price) & \
-                                     (dataframe['close'] < level_price) & (dataframe['open'] < level_price)
-                            
-                            # 添加调试日志
-                            if last_candle_index >= 0 and prev_candle is not None:
-                                condition1 = prev_candle['high'] < level_price
-                                condition2 = last_candle['high'] > level_price
-                                condition3 = last_candle['close'] < level_price
-                                condition4 = last_candle['open'] < level_price
-                                final_condition = condition1 and condition2 and condition3 and condition4
-                                logger.info(f"上影线流动性清扫 - 条件1(上一高点<水平): {condition1}, 条件2(当前高点>水平): {condition2}, 条件3(当前收盘<水平): {condition3}, 条件4(当前开盘<水平): {condition4}, 最终结果: {final_condition}")
-                                
-                                # 检查wick_up的值
-                                has_wick_up = wick_up.any() if isinstance(wick_up, pd.Series) else bool(wick_up)
-                                logger.info(f"wick_up.any()的值: {has_wick_up}")
-                                
-                                # 强制检查最后一根K线的条件
-                                last_candle_condition = final_condition
-                                
-                                # 只有当最后一根K线满足条件时才设置信号
-                                if last_candle_condition:
-                                    logger.info(f"WICK UP detected for {pair} at level {level_price} (ID: {level.id})")
-                                    # 只对满足条件的K线设置信号
-                                    wick_up_indices = wick_up if isinstance(wick_up, pd.Series) else pd.Series([wick_up], index=[last_candle_index])
-                                    dataframe.loc[wick_up_indices, 'level_wick_up'] = 1
-                                    dataframe.loc[wick_up_indices, 'level_id'] = level.id
-                                    dataframe.loc[wick_up_indices, 'level_price'] = level_price
-                        
-                        # 检测下影线流动性清扫（下影线穿过水平但实体没有）
-                        if level_direction in [LevelDirection.WICK_DOWN, LevelDirection.WICK_BOTH]:
-                            # 修正：下影线穿过水平但实体保持在水平上方
-                            # 确保上一根K线的低点高于水平，当前K线的低点低于水平，而且当前K线的开盘和收盘都高于水平
-                            wick_down = (dataframe['low'].shift(1) > level_price) & (dataframe['low'] < level_price) & \
-                                       (dataframe['close'] > level_price) & (dataframe['open'] > level_price)
-                            
-                            # 添加调试日志
-                            if last_candle_index >= 0 and prev_candle is not None:
-                                condition1 = prev_candle['low'] > level_price
-                                condition2 = last_candle['low'] < level_price
-                                condition3 = last_candle['close'] > level_price
-                                condition4 = last_candle['open'] > level_price
-                                final_condition = condition1 and condition2 and condition3 and condition4
-                                logger.info(f"下影线流动性清扫 - 条件1(上一低点>水平): {condition1}, 条件2(当前低点<水平): {condition2}, 条件3(当前收盘>水平): {condition3}, 条件4(当前开盘>水平): {condition4}, 最终结果: {final_condition}")
-                                
-                                # 检查wick_down的值
-                                has_wick_down = wick_down.any() if isinstance(wick_down, pd.Series) else bool(wick_down)
-                                logger.info(f"wick_down.any()的值: {has_wick_down}")
-                                
-                                # 强制检查最后一根K线的条件
-                                last_candle_condition = final_condition
-                                
-                                # 只有当最后一根K线满足条件时才设置信号
-                                if last_candle_condition:
-                                    logger.info(f"WICK DOWN detected for {pair} at level {level_price} (ID: {level.id})")
-                                    # 只对满足条件的K线设置信号
-                                    wick_down_indices = wick_down if isinstance(wick_down, pd.Series) else pd.Series([wick_down], index=[last_candle_index])
-                                    dataframe.loc[wick_down_indices, 'level_wick_down'] = 1
-                                    dataframe.loc[wick_down_indices, 'level_id'] = level.id
-                                    dataframe.loc[wick_down_indices, 'level_price'] = level_price
-                            
-                except SQLAlchemyError as e:
-                    logger.error(f"Database error checking price levels: {e}")
-                    # Initialize columns even if there was an error
-                    dataframe['level_cross_up'] = 0
-                    dataframe['level_cross_down'] = 0
-                    dataframe['level_wick_up'] = 0
-                    dataframe['level_wick_down'] = 0
-                    dataframe['level_id'] = 0
-                    dataframe['level_price'] = 0.0
-                except Exception as e:
-                    logger.error(f"Error checking price levels: {e}")
-                    logger.error(traceback.format_exc())
-                    # Initialize columns even if there was an error
-                    dataframe['level_cross_up'] = 0
-                    dataframe['level_cross_down'] = 0
-                    dataframe['level_wick_up'] = 0
-                    dataframe['level_wick_down'] = 0
-                    dataframe['level_id'] = 0
-                    dataframe['level_price'] = 0.0
+        # Level crossing detection only runs in live/dry run mode
+        if self._level_check_enabled is None:
+            self._level_check_enabled = self._resolve_level_check_enabled()
+        if not self._level_check_enabled:
+            # For backtesting/hyperopt, just add the columns with zeros
+            dataframe = _init_level_columns(dataframe)
+            return dataframe
+        
+        pair = metadata['pair']
+        # Get active price levels for this pair
+        try:
+            # Ensure database is initialized
+            if not ATRLevelSignal.db_initialized:
+                ATRLevelSignal.init_db_session()
+            
+            levels = []
+            last_candle_index = len(dataframe) - 1
+            # 至少需要两根K线才能判断穿越
+            if last_candle_index > 0:
+                # 只提取一次OHLC数组，后续区间过滤、检测与调试日志都直接使用
+                open_arr = dataframe['open'].to_numpy()
+                high_arr = dataframe['high'].to_numpy()
+                low_arr = dataframe['low'].to_numpy()
+                close_arr = dataframe['close'].to_numpy()
+                
+                # 等待bot_loop_start中提交的预取完成，其结果已写入区间缓存
+                prefetch = self._level_prefetch.pop(pair, None)
+                if prefetch is not None:
+                    prefetch.result()
+                
+                # 只有落在最后两根K线价格区间内的水平才可能在最后一根K线上触发信号，
+                # 因此直接在SQL中按区间过滤，远离当前价格的水平不参与计算
+                levels, level_vectors = PriceLevel.get_level_vectors_in_range(
+                    pair, float(low_arr[-2:].min()), float(high_arr[-2:].max())
+                )
+                logger.debug(f"Found {len(levels)} active price levels near price for {pair}")
+            
+            if levels:
+                level_ids, level_prices, dir_codes, confirm_close = level_vectors
+                
+                row_flags, level_idx, last_flags = _detect_level_signals(
+                    open_=open_arr,
+                    high=high_arr,
+                    low=low_arr,
+                    close=close_arr,
+                    close_prev=dataframe['close_prev'].to_numpy(),
+                    high_prev=_shift1(high_arr),
+                    low_prev=_shift1(low_arr),
+                    level_prices=level_prices,
+                    dir_codes=dir_codes,
+                    confirm_close=confirm_close,
+                )
+                
+                # 调试日志只在DEBUG级别开启时才构建
+                if logger.isEnabledFor(logging.DEBUG):
+                    last_idx, prev_idx = last_candle_index, last_candle_index - 1
+                    for j, level in enumerate(levels):
+                        logger.debug("===== 调试信息 - %s - 价格水平: %s =====", pair, level.level)
+                        logger.debug("方向: %s, 需要收盘确认: %s",
+                                     level.direction, bool(level.confirm_close))
+                        logger.debug("上一根K线 - 开盘: %s, 收盘: %s, 最高: %s, 最低: %s",
+                                     open_arr[prev_idx], close_arr[prev_idx],
+                                     high_arr[prev_idx], low_arr[prev_idx])
+                        logger.debug("当前K线 - 开盘: %s, 收盘: %s, 最高: %s, 最低: %s",
+                                     open_arr[last_idx], close_arr[last_idx],
+                                     high_arr[last_idx], low_arr[last_idx])
+                        logger.debug("最后一根K线结果 - 向上突破: %s, 向下突破: %s, "
+                                     "上影线清扫: %s, 下影线清扫: %s",
+                                     *(bool(last_flags[j] & bit) for bit in
+                                       (_CROSS_UP, _CROSS_DOWN, _WICK_UP, _WICK_DOWN)))
+                
+                for bit, label in ((_CROSS_UP, "UP CROSS"), (_CROSS_DOWN, "DOWN CROSS"),
+                                   (_WICK_UP, "WICK UP"), (_WICK_DOWN, "WICK DOWN")):
+                    for j in np.flatnonzero(last_flags & bit):
+                        logger.info("%s detected for %s at level %s (ID: %s)",
+                                    label, pair, level_prices[j], level_ids[j])
+                
+                # 只在触发信号的行上按位置写入点位ID和价格，其余行保持0
+                hit_rows = np.flatnonzero(level_idx >= 0)
+                hit_levels = level_idx[hit_rows]
+                level_id_arr = np.zeros(len(dataframe), dtype=np.int32)
+                level_id_arr[hit_rows] = level_ids[hit_levels]
+                level_price_arr = np.zeros(len(dataframe), dtype=np.float64)
+                level_price_arr[hit_rows] = level_prices[hit_levels]
+                
+                # 一次性整列写入所有信号列
+                dataframe = dataframe.assign(
+                    level_cross_up=(row_flags & 1).astype(np.int8),
+                    level_cross_down=((row_flags >> 1) & 1).astype(np.int8),
+                    level_wick_up=((row_flags >> 2) & 1).astype(np.int8),  # 上影线流动性清扫信号
+                    level_wick_down=((row_flags >> 3) & 1).astype(np.int8),  # 下影线流动性清扫信号
+                    level_id=level_id_arr,  # Store the level ID for reference
+                    level_price=level_price_arr,  # Store the level price for reference
+                )
             else:
-                # For backtesting/hyperopt, just add the columns with zeros
-                dataframe['level_cross_up'] = 0
-                dataframe['level_cross_down'] = 0
-                dataframe['level_wick_up'] = 0
-                dataframe['level_wick_down'] = 0
-                dataframe['level_id'] = 0
-                dataframe['level_price'] = 0.0
+                # Initialize level crossing columns
+                dataframe = _init_level_columns(dataframe)
+                    
+        except SQLAlchemyError as e:
+            logger.error(f"Database error checking price levels: {e}")
+            # Initialize columns even if there was an error
+            dataframe = _init_level_columns(dataframe)
+        except Exception as e:
+            logger.error(f"Error checking price levels: {e}")
+            logger.error(traceback.format_exc())
+            # Initialize columns even if there was an error
+            dataframe = _init_level_columns(dataframe)
                 
         return dataframe
 
     def populate_buy_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        # 参数只读取一次，并转换为普通float参与ndarray运算
+        atr_threshold = float(self.atr_threshold)
+        check_level_crossing = bool(self.check_level_crossing)
+        
         # Add ATR sudden increase condition
+        # 复用populate_indicators中已计算的atr_prev，直接在ndarray上比较
         atr_increase = (
-            dataframe['atr'] > dataframe['atr'].shift(1) * self.atr_threshold
+            dataframe['atr'].to_numpy() > dataframe['atr_prev'].to_numpy() * atr_threshold
         )
         
         # Add level crossing condition (if enabled)
-        if self.check_level_crossing:
-            level_cross_up = dataframe['level_cross_up'] == 1
-            level_wick_up = dataframe['level_wick_up'] == 1  # 新增：上影线流动性清扫
-            level_wick_down = dataframe['level_wick_down'] == 1  # 新增：下影线流动性清扫
-            
+        if check_level_crossing:
             # Buy on either ATR increase, level crossing up, 或流动性清扫
-            dataframe.loc[atr_increase | level_cross_up | level_wick_up | level_wick_down, 'buy'] = 1
+            buy_signal = np.logical_or.reduce((
+                atr_increase,
+                dataframe['level_cross_up'].to_numpy() == 1,
+                dataframe['level_wick_up'].to_numpy() == 1,  # 新增：上影线流动性清扫
+                dataframe['level_wick_down'].to_numpy() == 1,  # 新增：下影线流动性清扫
+            ))
         else:
             # Original ATR signal only
-            dataframe.loc[atr_increase, 'buy'] = 1
+            buy_signal = atr_increase
+        # 整列一次写入int8信号，避免.loc散写与dtype推断
+        dataframe['buy'] = buy_signal.astype(np.int8)
         
         # Send Telegram notification when buy signal occurs
-        if self.dp.runmode.value in ('live', 'dry_run'):
-            last_candle = dataframe.iloc[-1]
-            if last_candle['buy'] == 1:
-                # Pass current candle data to notification method
-                self.send_telegram_notification(metadata['pair'], last_candle)
+        if self._notify_live is None:
+            self._notify_live = self.dp.runmode.value in self.LIVE_RUNMODES
+        # 先用信号数组判断最后一根K线，只有需要通知时才构造该行的Series
+        if self._notify_live and buy_signal[-1]:
+            # Pass current candle data to notification method
+            self.send_telegram_notification(metadata['pair'], dataframe.iloc[-1])
                 
         return dataframe
 
@@ -619,21 +1097,25 @@ class ATRLevelSignal(IStrategy):
         Exit signal placeholder implementation.
         Sets 'exit_long' to 0 for all rows (no active exit signals).
         """
-        dataframe['exit_long'] = 0
+        # 参数只读取一次，与populate_buy_trend一致
+        check_level_crossing = bool(self.check_level_crossing)
         
         # Add level crossing down as exit signal if enabled
-        if self.check_level_crossing:
-            level_cross_down = dataframe['level_cross_down'] == 1
-            dataframe.loc[level_cross_down, 'exit_long'] = 1
+        if check_level_crossing:
+            dataframe['exit_long'] = (dataframe['level_cross_down'].to_numpy() == 1).astype(np.int8)
+        else:
+            dataframe['exit_long'] = np.zeros(len(dataframe), dtype=np.int8)
             
         return dataframe
 
     def send_telegram_notification(self, pair: str, candle: Series):
         """Send notification via Telegram with detailed metrics"""
         try:
+            # 只做一次Series到dict的转换，后续字段读取都是普通dict查找
+            c = candle.to_dict()
             # Calculate ATR change rate safely
-            if candle['atr_prev'] != 0:
-                atr_change = (candle['atr'] / candle['atr_prev'] - 1) * 100
+            if c['atr_prev'] != 0:
+                atr_change = (c['atr'] / c['atr_prev'] - 1) * 100
             else:
                 atr_change = 0
             
@@ -644,50 +1126,32 @@ class ATRLevelSignal(IStrategy):
             level_id = None
             level_price = None
             atr_value = None
+            atr_surge = False
             
             if self.check_level_crossing:
-                if candle.get('level_cross_up', 0) == 1:
-                    level_id = int(candle.get('level_id', 0))
-                    level_price = float(candle.get('level_price', 0.0))
-                    signal_type = "🔼 Level Cross UP"
-                    signal_details = f"▫ 价格穿越上升点位: {level_price:.6f} (ID: {level_id})"
-                    signal_db_type = "level_cross_up"
-                elif candle.get('level_cross_down', 0) == 1:
-                    level_id = int(candle.get('level_id', 0))
-                    level_price = float(candle.get('level_price', 0.0))
-                    signal_type = "🔽 Level Cross DOWN"
-                    signal_details = f"▫ 价格穿越下降点位: {level_price:.6f} (ID: {level_id})"
-                    signal_db_type = "level_cross_down"
-                elif candle.get('level_wick_up', 0) == 1:
-                    level_id = int(candle.get('level_id', 0))
-                    level_price = float(candle.get('level_price', 0.0))
-                    signal_type = "🔝 Wick UP Liquidity Sweep"
-                    signal_details = f"▫ 上影线扫动流动性: {level_price:.6f} (ID: {level_id})"
-                    signal_db_type = "level_wick_up"
-                elif candle.get('level_wick_down', 0) == 1:
-                    level_id = int(candle.get('level_id', 0))
-                    level_price = float(candle.get('level_price', 0.0))
-                    signal_type = "🔻 Wick DOWN Liquidity Sweep"
-                    signal_details = f"▫ 下影线扫动流动性: {level_price:.6f} (ID: {level_id})"
-                    signal_db_type = "level_wick_down"
-                elif candle['atr'] > candle['atr_prev'] * self.atr_threshold:
-                    signal_type = "🚨 ATR Surge"
-                    signal_details = f"▫ ATR变动率: {atr_change:.2f}%"
-                    signal_db_type = "atr_surge"
-                    atr_value = float(candle['atr'])
+                for column, title, label in self._LEVEL_SIGNAL_TABLE:
+                    if c.get(column, 0) == 1:
+                        level_id = int(c.get('level_id', 0))
+                        level_price = float(c.get('level_price', 0.0))
+                        signal_type = title
+                        signal_details = f"▫ {label}: {level_price:.6f} (ID: {level_id})"
+                        signal_db_type = column
+                        break
+                else:
+                    atr_surge = c['atr'] > c['atr_prev'] * self.atr_threshold
             else:
+                atr_surge = True
+            
+            if atr_surge:
                 signal_type = "🚨 ATR Surge"
                 signal_details = f"▫ ATR变动率: {atr_change:.2f}%"
                 signal_db_type = "atr_surge"
-                atr_value = float(candle['atr'])
+                atr_value = float(c['atr'])
                 
             # Format message with required metrics
-            message = (
-                f"{signal_type} on {pair} ({self.timeframe})\n"
-                f"{signal_details}\n"
-                f"▫ 实际ATR: {candle['atr']:.6f}\n"
-                f"▫ 前一价格: {candle['close_prev']:.6f}\n"
-                f"▫ 当前价格: {candle['close']:.6f}"
+            message = self._MSG_TEMPLATE % (
+                signal_type, pair, self.timeframe, signal_details,
+                c['atr'], c['close_prev'], c['close'],
             )
             self.dp.send_msg(message)
             
@@ -698,17 +1162,17 @@ class ATRLevelSignal(IStrategy):
                     if not ATRLevelSignal.db_initialized:
                         ATRLevelSignal.init_db_session()
                     
-                    # Record the signal
-                    SignalHistory.add_signal(
+                    # Queue the signal, the background writer inserts it in the next batch
+                    SignalHistory.queue_signal(
                         pair=pair,
                         signal_type=signal_db_type,
-                        prev_price=float(candle['close_prev']),
-                        current_price=float(candle['close']),
+                        prev_price=float(c['close_prev']),
+                        current_price=float(c['close']),
                         level_id=level_id if level_id and level_id > 0 else None,
                         level_price=level_price if level_price else None,
-                        atr_value=atr_value if atr_value else float(candle['atr'])
+                        atr_value=atr_value if atr_value else float(c['atr'])
                     )
-                    logger.info(f"Signal recorded in history: {signal_type} for {pair}")
+                    logger.info(f"Signal queued for history: {signal_type} for {pair}")
                 except Exception as e:
                     logger.error(f"Failed to record signal in history: {e}")
                     logger.error(traceback.format_exc())
@@ -762,18 +1226,13 @@ class ATRLevelSignal(IStrategy):
                 ATRLevelSignal.init_db_session()
                 
             levels = PriceLevel.get_levels(pair)
-            result = []
-            for level in levels:
-                result.append({
-                    "id": level.id,
-                    "pair": level.pair,
-                    "level": level.level,
-                    "direction": level.direction,
-                    "created_at": level.created_at.isoformat(),
-                    "active": bool(level.active),
-                    "confirm_close": bool(level.confirm_close)
-                })
-            return result
+            return [
+                dict(zip(_LEVEL_DICT_FIELDS, _get_level_fields(level)),
+                     created_at=level.created_at.isoformat(),
+                     active=bool(level.active),
+                     confirm_close=bool(level.confirm_close))
+                for level in levels
+            ]
         except Exception as e:
             logger.error(f"Failed to get price levels: {e}")
             logger.error(traceback.format_exc())
@@ -829,6 +1288,7 @@ class ATRLevelSignal(IStrategy):
                 price_level.confirm_close = 1 if confirm_close else 0
             
             PriceLevel.session.commit()
+            PriceLevel.invalidate_cache()
             
             return {
                 "success": True,
@@ -893,22 +1353,11 @@ class ATRLevelSignal(IStrategy):
             )
             
             # Convert to dictionaries
-            result = []
-            for signal in signals:
-                signal_dict = {
-                    "id": signal.id,
-                    "pair": signal.pair,
-                    "signal_type": signal.signal_type,
-                    "level_id": signal.level_id,
-                    "level_price": signal.level_price,
-                    "prev_price": signal.prev_price,
-                    "current_price": signal.current_price,
-                    "atr_value": signal.atr_value,
-                    "created_at": signal.created_at.isoformat()
-                }
-                result.append(signal_dict)
-            
-            return result
+            return [
+                dict(zip(_SIGNAL_DICT_FIELDS, _get_signal_fields(signal)),
+                     created_at=signal.created_at.isoformat())
+                for signal in signals
+            ]
         except Exception as e:
             logger.error(f"Failed to get signal history: {e}")
             logger.error(traceback.format_exc())
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from freqtrade.strategy import IStrategy
 from pandas import DataFrame, Series
 import pandas_ta as ta
@@ -13,6 +14,9 @@ class ATRSignal(IStrategy):
     atr_length = 14  # ATR calculation period
     atr_threshold = 1.2  # Threshold for sudden increase (1.5x previous ATR)
     stoploss = -0.10  # Required stoploss (10%) added to fix validation error
+    # Run modes with Telegram notifications, resolved once on first use (dp is attached after init)
+    LIVE_RUNMODES = frozenset(('live', 'dry_run'))
+    _notify_live = None
     timezone = 'Asia/Shanghai'  # Default timezone for notifications
 
     def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
@@ -30,18 +34,24 @@ class ATRSignal(IStrategy):
         return dataframe
 
     def populate_buy_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
+        # 参数只读取一次，并转换为普通float参与ndarray运算
+        atr_threshold = float(self.atr_threshold)
+        
         # Add ATR sudden increase condition
+        # 复用populate_indicators中已计算的atr_prev，直接在ndarray上比较
         atr_increase = (
-            dataframe['atr'] > dataframe['atr'].shift(1) * self.atr_threshold
+            dataframe['atr'].to_numpy() > dataframe['atr_prev'].to_numpy() * atr_threshold
         )
-        dataframe.loc[atr_increase, 'buy'] = 1
+        # 整列一次写入int8信号，避免.loc散写与dtype推断
+        dataframe['buy'] = atr_increase.astype(np.int8)
         
         # Send Telegram notification when buy signal occurs
-        if self.dp.runmode.value in ('live', 'dry_run'):
-            last_candle = dataframe.iloc[-1]
-            if last_candle['buy'] == 1:
-                # Pass current candle data to notification method
-                self.send_telegram_notification(metadata['pair'], last_candle)
+        if self._notify_live is None:
+            self._notify_live = self.dp.runmode.value in self.LIVE_RUNMODES
+        # 先用信号数组判断最后一根K线，只有需要通知时才构造该行的Series
+        if self._notify_live and atr_increase[-1]:
+            # Pass current candle data to notification method
+            self.send_telegram_notification(metadata['pair'], dataframe.iloc[-1])
                 
         return dataframe
 
@@ -1,4 +1,5 @@
 import argparse
+import io
 import logging
 import os
 import psycopg2
@@ -7,7 +8,34 @@ import re
 from collections import defaultdict
 from consts import config  # Reuse existing database configuration
 
+# Patterns used by find_called_procedures, compiled once at import
+# Single-line comments (-- until end of line)
+_RE_LINE_COMMENT = re.compile(r'--.*$', re.MULTILINE)
+# Multi-line comments (/*...*/)
+_RE_BLOCK_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+# Explicit CALL statements and EXECUTE statements in a single pass, in source order.
+# CALL only needs the opening parenthesis as anchor, the argument list is not scanned.
+# Names are captured in lookaheads so a match never swallows the next keyword.
+_RE_CALLEE = re.compile(
+    r'\b(?:CALL\s+(?=((?:\w+\.)?\w+)\s*\()'
+    r'|EXECUTE\s+(?=((?:\w+\.)?\w+)))',
+    re.IGNORECASE
+)
+
+# Characters not allowed in saved file names, each replaced by '_' via str.translate
+_UNSAFE_FS = str.maketrans(dict.fromkeys('\\/*?:"<>|', '_'))
+
+# Enhanced SQL keyword list
+SQL_KEYWORDS = frozenset({
+    'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 
+    'JOIN', 'GROUP BY', 'ORDER BY', 'HAVING', 'LIMIT', 'OFFSET',
+    'COALESCE', 'SUM', 'MAX', 'MIN', 'AVG', 'COUNT', 'FILTER'
+})
+
 class ProcedureAnalyzer:
+    LOAD_BATCH_SIZE = 50  # Procedure files sent per execute in load_procedures
+    FETCH_ITERSIZE = 50  # Definitions per round-trip of the server-side cursor in get_procedure_definitions
+
     def __init__(self):
         self.conn = None
         self.target_conn = None  # Add target database connection
@@ -15,6 +43,10 @@ class ProcedureAnalyzer:
         self.visited = set()
         self.max_depth = 0
         self.save_dir = None
+        # Parsed callee lists keyed by definition text, so identical bodies (e.g. the root
+        # reached again as public.<name>, or templated procedures) are only parsed once
+        self._parse_cache = {}
+        self.cycle_nodes = set()  # Procedures that are part of a recursive call group
 
     def connect(self):
         """Establish database connection using existing config"""
@@ -60,30 +92,42 @@ class ProcedureAnalyzer:
             result = cursor.fetchone()
             return result[0] if result else None
 
+    def get_procedure_definitions(self, proc_names):
+        """Retrieve the definitions of several stored procedures in a single query"""
+        # Handle schema-qualified names
+        bare_names = {name: name.split('.')[-1] for name in proc_names}
+        definitions = {}
+        # Named (server-side) cursor: rows are paged in FETCH_ITERSIZE at a time instead of
+        # materializing every definition of a wide call-graph level in the client at once
+        with self.conn.cursor(name='proc_batch') as cursor:
+            cursor.itersize = self.FETCH_ITERSIZE
+            cursor.execute("""
+                SELECT proname, pg_get_functiondef(p.oid)
+                FROM pg_proc p
+                JOIN pg_namespace n ON p.pronamespace = n.oid
+                WHERE n.nspname = 'public' 
+                AND proname = ANY(%s)
+            """, (list(set(bare_names.values())),))
+            for proname, definition in cursor:
+                # Overloaded procedures: keep the first definition, like fetchone()
+                definitions.setdefault(proname, definition)
+        return {name: definitions.get(bare) for name, bare in bare_names.items()}
+
     def find_called_procedures(self, definition):
         """Find called procedures in definition using regex patterns"""
-        # New: Remove comments before processing
-        # Remove single-line comments (-- until end of line)
-        definition = re.sub(r'--.*$', '', definition, flags=re.MULTILINE)
-        # Remove multi-line comments (/*...*/)
-        definition = re.sub(r'/\*.*?\*/', '', definition, flags=re.DOTALL)
+        # Bodies without any CALL/EXECUTE keyword (e.g. plain SELECT wrappers) can't call anything
+        lowered = definition.lower()
+        if 'call' not in lowered and 'execute' not in lowered:
+            return []
 
-        # Enhanced CALL pattern with better parameter handling
-        patterns = [
-            r'\bCALL\s+((?:[\w]+\.)?[\w_]+)\s*\([^\)]*\)',  # Explicit CALL statements
-            r'\bEXECUTE\s+((?:[\w]+\.)?[\w_]+)\s*\b',       # EXECUTE statements
-        ]
-        
-        # Enhanced SQL keyword list
-        SQL_KEYWORDS = {
-            'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 
-            'JOIN', 'GROUP BY', 'ORDER BY', 'HAVING', 'LIMIT', 'OFFSET',
-            'COALESCE', 'SUM', 'MAX', 'MIN', 'AVG', 'COUNT', 'FILTER'
-        }
+        # New: Remove comments before processing
+        # (substring checks skip the regex pass entirely for bodies without comments)
+        if '--' in definition:
+            definition = _RE_LINE_COMMENT.sub('', definition)
+        if '/*' in definition:
+            definition = _RE_BLOCK_COMMENT.sub('', definition)
 
-        matches = []
-        for pattern in patterns:
-            matches += re.findall(pattern, definition, re.IGNORECASE)
+        matches = [call or execute for call, execute in _RE_CALLEE.findall(definition)]
 
         # Modified: Maintain call order while deduplicating
         seen = set()
@@ -99,73 +143,157 @@ class ProcedureAnalyzer:
         return valid_procedures
 
     def build_call_graph(self, root_proc, current_depth=0):
-        """Recursively build call graph with depth tracking"""
-        if current_depth > 20:  # Prevent infinite recursion
-            return
-        if root_proc in self.visited:
-            return
-            
-        self.visited.add(root_proc)
-        self.max_depth = max(self.max_depth, current_depth)
-        
-        definition = self.get_procedure_definition(root_proc)
-        if not definition:
-            return
+        """
+        Build call graph breadth-first with depth tracking.
+        Definitions of a whole level are fetched in one query (one round-trip per depth).
+        Cycles are cut by self.visited, so no depth limit is needed.
+        """
+        frontier = [root_proc]
+        while frontier:
+            # Deduplicate while keeping order, skip procedures seen on earlier levels
+            frontier = [proc for proc in dict.fromkeys(frontier) if proc not in self.visited]
+            if not frontier:
+                break
+            self.visited.update(frontier)
+            self.max_depth = max(self.max_depth, current_depth)
 
-        # Add procedure saving logic    
-        self._save_procedure_definition(root_proc, definition)
-            
-        called_procs = self.find_called_procedures(definition)
-        for proc in called_procs:
-            if '.' not in proc:  # Add schema prefix if missing
-                proc = f'public.{proc}'
-            self.call_graph[root_proc].append(proc)
-            self.build_call_graph(proc, current_depth + 1)
+            definitions = self.get_procedure_definitions(frontier)
+            next_frontier = []
+            for proc_name in frontier:
+                definition = definitions[proc_name]
+                if not definition:
+                    continue
+
+                # Add procedure saving logic    
+                self._save_procedure_definition(proc_name, definition)
+
+                called_procs = self._parse_cache.get(definition)
+                if called_procs is None:
+                    called_procs = self._parse_cache[definition] = self.find_called_procedures(definition)
+                for proc in called_procs:
+                    if '.' not in proc:  # Add schema prefix if missing
+                        proc = f'public.{proc}'
+                    self.call_graph[proc_name].append(proc)
+                    next_frontier.append(proc)
+
+            frontier = next_frontier
+            current_depth += 1
+
+        cycles = [scc for scc in self._strongly_connected_components()
+                  if len(scc) > 1 or scc[0] in self.call_graph.get(scc[0], ())]
+        self.cycle_nodes = {proc for scc in cycles for proc in scc}
+        for scc in cycles:
+            logging.info(f"Recursive call group: {', '.join(scc)}")
+
+    def _strongly_connected_components(self):
+        """
+        Strongly connected components of call_graph (Tarjan's algorithm), iterative so
+        deep call chains can't hit the recursion limit
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        sccs = []
+        for root in list(self.call_graph):
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.call_graph.get(root, ())))]
+            while work:
+                proc, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.call_graph.get(child, ()))))
+                        break
+                    if child in on_stack:
+                        lowlink[proc] = min(lowlink[proc], index[child])
+                else:
+                    # All children done: propagate lowlink and pop a finished component
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[proc])
+                    if lowlink[proc] == index[proc]:
+                        scc = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            scc.append(member)
+                            if member == proc:
+                                break
+                        sccs.append(scc)
+        return sccs
 
     def print_results(self, root_proc, output_file=None):
         """Print hierarchical call structure with formatting and optionally save to file"""
-        output = []
-        output.append(f"\nCall hierarchy for {root_proc}:")
-        self._build_hierarchy_output(root_proc, output)
+        buf = io.StringIO()
+        buf.write(f"\nCall hierarchy for {root_proc}:")
+        self._build_hierarchy_output(root_proc, buf)
+        output = buf.getvalue()
         
         # Print to console
-        print('\n'.join(output))
+        print(output)
         
         # Save to file if specified
         if output_file:
             try:
                 with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(output))
+                    f.write(output)
                 logging.info(f"Call hierarchy saved to {output_file}")
             except Exception as e:
                 logging.error(f"Failed to save output: {str(e)}")
 
-    def _build_hierarchy_output(self, proc, output, level=0, last=False, prefix=''):
-        """Recursive helper for building hierarchy output with ASCII art"""
+    def _build_hierarchy_output(self, proc, buf, level=0, last=False, prefix=''):
+        """
+        Helper for building hierarchy output with ASCII art (iterative pre-order walk).
+        Each node is written to buf as a newline followed by its line, so the text matches
+        joining the lines with newlines.
+        """
         connectors = {
             'mid': '├── ',
             'end': '└── ',
             'vertical': '│   ',
             'space': '    '
         }
+        mid = connectors['mid']
+        end = connectors['end']
         
-        # Current node
-        line = f"{prefix}{connectors['end' if last else 'mid']}{proc}"
-        output.append(line)
-        
-        # Children processing
-        new_prefix = prefix + (connectors['vertical'] if not last else connectors['space'])
-        children = self.call_graph.get(proc, [])
-        for i, child in enumerate(children):
-            is_last = i == len(children) - 1
-            self._build_hierarchy_output(child, output, level+1, is_last, new_prefix)
+        # Work stack of (procedure, prefix, is_last, level)
+        stack = [(proc, prefix, last, level)]
+        path = []  # Procedures on the branch leading to the current node
+        while stack:
+            proc, prefix, last, level = stack.pop()
+            
+            # Current node, a procedure already on its own call path is marked and not descended
+            del path[level:]
+            cyclic = proc in self.cycle_nodes and proc in path
+            buf.write('\n')
+            buf.write(prefix)
+            buf.write(end if last else mid)
+            buf.write(proc)
+            if cyclic:
+                buf.write(' (cycle)')
+                continue
+            path.append(proc)
+            
+            # Children processing, pushed in reverse so they are popped in call order
+            new_prefix = prefix + (connectors['vertical'] if not last else connectors['space'])
+            children = self.call_graph.get(proc, [])
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], new_prefix, i == len(children) - 1, level + 1))
 
     def _save_procedure_definition(self, proc_name, definition):
         """Save procedure definition to file"""
         if not self.save_dir or not definition:
             return
             
-        safe_name = re.sub(r'[\\/*?:"<>|]', "_", proc_name)
+        safe_name = proc_name.translate(_UNSAFE_FS)
         file_path = os.path.join(self.save_dir, f"{safe_name}.sql")
         try:
             logging.info(f"Starting save operation for procedure: {proc_name}")
@@ -185,30 +313,41 @@ class ProcedureAnalyzer:
 
         logging.info(f"Starting procedure loading from directory: {self.save_dir}")
         loaded_count = 0
-        
-        for file_name in os.listdir(self.save_dir):
-            if file_name.endswith('.sql'):
-                proc_name = file_name[:-4]
-                file_path = os.path.join(self.save_dir, file_name)
-                logging.debug(f"Processing file: {file_path}")
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        definition = f.read()
-                    logging.info(f"Loading procedure {proc_name} ({len(definition)} bytes)")
-                    
-                    with self.target_conn.cursor() as cursor:
-                        cursor.execute(definition)
-                        logging.info(f"Executed DDL for procedure {proc_name}")
-                    self.target_conn.commit()
-                    loaded_count += 1
-                    logging.debug(f"Successfully committed transaction for {proc_name}")
-                except Exception as e:
-                    logging.error(f"Failed to load {proc_name}: {str(e)}")
-                    logging.debug(f"Error context:", exc_info=True)
-                    self.target_conn.rollback()
-                    logging.debug(f"Rolled back transaction for {proc_name}")
-        
+
+        procedures = []
+        with os.scandir(self.save_dir) as it:
+            entries = sorted((entry for entry in it if entry.name.endswith('.sql') and entry.is_file()),
+                             key=lambda entry: entry.name)
+        for entry in entries:
+            proc_name = entry.name[:-4]
+            logging.debug(f"Processing file: {entry.path}")
+            try:
+                with open(entry.path, 'r', encoding='utf-8', buffering=65536) as f:
+                    definition = f.read()
+            except Exception as e:
+                logging.error(f"Failed to read {entry.path}: {str(e)}")
+                continue
+            logging.info(f"Loading procedure {proc_name} ({len(definition)} bytes)")
+            procedures.append((proc_name, definition))
+
+        # All DDL runs in one transaction, LOAD_BATCH_SIZE files per execute, committed once
+        batch_size = self.LOAD_BATCH_SIZE
+        try:
+            with self.target_conn.cursor() as cursor:
+                for start in range(0, len(procedures), batch_size):
+                    chunk = procedures[start:start + batch_size]
+                    cursor.execute(';\n'.join(definition for _, definition in chunk))
+                    loaded_count += len(chunk)
+                    logging.info(f"Executed DDL for procedures {', '.join(name for name, _ in chunk)}")
+            self.target_conn.commit()
+            logging.debug(f"Successfully committed transaction for {loaded_count} procedures")
+        except Exception as e:
+            logging.error(f"Failed to load procedure batch: {str(e)}")
+            logging.debug(f"Error context:", exc_info=True)
+            self.target_conn.rollback()
+            logging.debug(f"Rolled back transaction for {len(procedures)} procedures")
+            loaded_count = 0
+
         logging.info(f"Loading completed. Successfully loaded {loaded_count} procedures")
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from freqtrade.strategy import IStrategy
 from pandas import DataFrame
+import numpy as np
 import talib.abstract as ta
 
 class MyStrategy(IStrategy):
@@ -24,16 +25,13 @@ class MyStrategy(IStrategy):
 
     def populate_entry_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         # generate entry signals based on indicator values
-        dataframe.loc[
-            (dataframe['rsi'] < 20),
-            'enter_long'] = 1
+        # 直接在ndarray上比较, 避免布尔Series和.loc掩码赋值
+        dataframe['enter_long'] = (dataframe['rsi'].to_numpy() < 20).astype(np.int8)
 
         return dataframe
 
     def populate_exit_trend(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
         # generate exit signals based on indicator values
-        dataframe.loc[
-            (dataframe['rsi'] > 70),
-            'exit_long'] = 1
+        dataframe['exit_long'] = (dataframe['rsi'].to_numpy() > 70).astype(np.int8)
 
         return dataframe
\ No newline at end of file
@@ -3,83 +3,160 @@
 # 清扫前日高点之后，在低时间周期中，根据单K线翻转模型入场做空。
 # 清扫当日低点之后，在低时间周期中，根据单K线翻转模型入场做多。
 
+import numpy as np
 from pandas import DataFrame
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the NumPy implementation is used without it
+    njit = None
+
+def _centered3_min(values: np.ndarray) -> np.ndarray:
+    # Same as Series.rolling(3, center=True).min(): NaN at both edges and wherever the window has a NaN
+    out = np.full(values.shape, np.nan)
+    out[1:-1] = np.minimum(np.minimum(values[:-2], values[1:-1]), values[2:])
+    return out
+
+def _centered3_max(values: np.ndarray) -> np.ndarray:
+    # Same as Series.rolling(3, center=True).max()
+    out = np.full(values.shape, np.nan)
+    out[1:-1] = np.maximum(np.maximum(values[:-2], values[1:-1]), values[2:])
+    return out
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    # Same as Series.shift(periods) on a float array
+    out = np.full(values.shape, np.nan)
+    out[periods:] = values[:-periods]
+    return out
+
+def _liquidity_signals_numpy(low, high, close, volume, rsi, low_1d, high_1d, volume_ma):
+    prev_low_1d = _shift(low_1d, 1)  # previous row's daily low
+    prev_high_1d = _shift(high_1d, 1)  # previous row's daily high
+    sweep_low = (low < prev_low_1d) & (close > prev_low_1d)
+    sweep_high = (high > prev_high_1d) & (close < prev_high_1d)
+    bullish_order_block = (low == _centered3_min(low)) & (high < _shift(low, 2))
+    bearish_order_block = (high == _centered3_max(high)) & (low > _shift(high, 2))
+    volume_ok = volume > volume_ma
+    long_signal = sweep_low & (rsi < 30) & volume_ok
+    short_signal = sweep_high & (rsi > 70) & volume_ok
+    return sweep_low, sweep_high, bullish_order_block, bearish_order_block, long_signal, short_signal
+
+def _liquidity_signals_kernel(low, high, close, volume, rsi, low_1d, high_1d, volume_ma):
+    # Same masks as _liquidity_signals_numpy in one pass over the candles (compiled with numba).
+    # Comparisons against NaN are False, matching the pandas/NumPy NaN semantics.
+    n = low.shape[0]
+    sweep_low = np.zeros(n, dtype=np.bool_)
+    sweep_high = np.zeros(n, dtype=np.bool_)
+    bullish_order_block = np.zeros(n, dtype=np.bool_)
+    bearish_order_block = np.zeros(n, dtype=np.bool_)
+    long_signal = np.zeros(n, dtype=np.bool_)
+    short_signal = np.zeros(n, dtype=np.bool_)
+    for i in range(1, n):
+        prev_low_1d = low_1d[i - 1]
+        prev_high_1d = high_1d[i - 1]
+        sl = low[i] < prev_low_1d and close[i] > prev_low_1d
+        sh = high[i] > prev_high_1d and close[i] < prev_high_1d
+        sweep_low[i] = sl
+        sweep_high[i] = sh
+        volume_ok = volume[i] > volume_ma[i]
+        long_signal[i] = sl and rsi[i] < 30 and volume_ok
+        short_signal[i] = sh and rsi[i] > 70 and volume_ok
+        if 2 <= i < n - 1:
+            # centered 3-candle extreme: not above/below either neighbour
+            bullish_order_block[i] = (low[i] <= low[i - 1] and low[i] <= low[i + 1]
+                                      and high[i] < low[i - 2])
+            bearish_order_block[i] = (high[i] >= high[i - 1] and high[i] >= high[i + 1]
+                                      and low[i] > high[i - 2])
+    return sweep_low, sweep_high, bullish_order_block, bearish_order_block, long_signal, short_signal
+
+def _ffill_where_numpy(values, mask):
+    # Index of the last row where mask was True, -1 before the first one
+    last = np.maximum.accumulate(np.where(mask, np.arange(values.shape[0]), -1))
+    out = values[last]
+    out[last < 0] = np.nan
+    return out
+
+def _ffill_where_kernel(values, mask):
+    # Same as Series.where(mask).ffill() in one pass (compiled with numba)
+    out = np.empty_like(values)
+    last = np.nan
+    for i in range(values.shape[0]):
+        if mask[i] and not np.isnan(values[i]):
+            last = values[i]
+        out[i] = last
+    return out
+
+if njit is not None:
+    _liquidity_signals_kernel = njit(cache=True)(_liquidity_signals_kernel)
+    _ffill_where_kernel = njit(cache=True)(_ffill_where_kernel)
+
+def _liquidity_signals(dataframe: DataFrame):
+    """
+    Sweep, order block and entry signal masks for populate_indicators,
+    using the numba kernel when available
+    """
+    arrays = [dataframe[col].to_numpy(dtype=np.float64) for col in
+              ('low', 'high', 'close', 'volume', 'rsi', 'low_1D', 'high_1D', 'volume_ma_1D')]
+    if njit is not None:
+        return _liquidity_signals_kernel(*arrays)
+    return _liquidity_signals_numpy(*arrays)
+
+def _ffill_where(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Last value where mask is True, carried forward (NaN before the first one)
+    """
+    if njit is not None:
+        return _ffill_where_kernel(values, mask)
+    return _ffill_where_numpy(values, mask)
+
 def populate_indicators(self, dataframe: DataFrame, metadata: dict) -> DataFrame:
     # Get 1D timeframe data using Freqtrade's dataframe analyzer
     informative = self.dp.get_analyzer_dataframe(metadata['pair'], '1D')
     
-    # Merge daily data into 15m timeframe using forward fill
-    dataframe = dataframe.merge(
-        informative[['high', 'low', 'volume']],
-        right_index=True,
-        left_index=True,
-        how='left',
-        suffixes=('', '_1D')
-    ).ffill()
-
-    # Update sweep conditions using daily reference
-    dataframe['sweep_low'] = (
-        (dataframe['low'] < dataframe['low_1D'].shift(1)) &  # Compare with previous day's low
-        (dataframe['close'] > dataframe['low_1D'].shift(1))  # Close above swept daily level
-    )
-    
-    dataframe['sweep_high'] = (
-        (dataframe['high'] > dataframe['high_1D'].shift(1)) &  # Compare with previous day's high
-        (dataframe['close'] < dataframe['high_1D'].shift(1))  # Close below swept daily level
-    )
+    # Align daily data to the 15m timeframe using forward fill: each row takes the last
+    # daily row at or before its index, without a merge and a whole-frame ffill pass
+    aligned = informative[['high', 'low', 'volume']].reindex(dataframe.index, method='ffill')
+    for col in ('high', 'low', 'volume'):
+        dataframe[f'{col}_1D'] = aligned[col].to_numpy()
 
     # Update volume condition to use daily reference
     dataframe['volume_ma_1D'] = dataframe['volume_1D'].rolling(20).mean()
 
-    # Add order block detection logic
-    # Detect bullish order blocks according to SMC definition (modified for uptrend base)
-    dataframe['bullish_order_block'] = (
-        (dataframe['low'] == dataframe['low'].rolling(3, center=True).min()) &  # Local low
-        # Fix future data reference by checking previous candles instead of future
-        (dataframe['high'] < dataframe['low'].shift(2))  # FVG above (use past 2 candles instead of future)
-    )
+    # Sweep conditions use the daily reference of the previous row, order blocks
+    # compare centered 3-candle extremes with the candle 2 bars back (no future data).
+    # All masks come from a single fused pass instead of one pandas expression each.
+    (sweep_low, sweep_high, bullish_order_block, bearish_order_block,
+     long_signal, short_signal) = _liquidity_signals(dataframe)
+    # Signal columns are stored as int8 (0/1)
+    dataframe['sweep_low'] = sweep_low.astype(np.int8)
+    dataframe['sweep_high'] = sweep_high.astype(np.int8)
+    dataframe['bullish_order_block'] = bullish_order_block.astype(np.int8)
+    dataframe['bearish_order_block'] = bearish_order_block.astype(np.int8)
 
-    # Detect bearish order blocks (large bearish candle after sweep)
-    dataframe['bearish_order_block'] = (
-        (dataframe['high'] == dataframe['high'].rolling(3, center=True).max()) &  # Local high
-        # Fix future data reference by checking previous candles instead of future
-        (dataframe['low'] > dataframe['high'].shift(2))  # FVG below (use past 2 candles instead of future)
-    )
-    
     # Track most recent order block levels
-    dataframe['order_block_low'] = dataframe['low'].where(dataframe['bullish_order_block']).ffill()
-    dataframe['order_block_high'] = dataframe['high'].where(dataframe['bearish_order_block']).ffill()
+    dataframe['order_block_low'] = _ffill_where(dataframe['low'].to_numpy(dtype=np.float64), bullish_order_block)
+    dataframe['order_block_high'] = _ffill_where(dataframe['high'].to_numpy(dtype=np.float64), bearish_order_block)
 
-    dataframe['long_signal'] = (
-        dataframe['sweep_low'] &
-        (dataframe['rsi'] < 30) &
-        (dataframe['volume'] > dataframe['volume_ma_1D'])
-    )
-    
+    dataframe['long_signal'] = long_signal.astype(np.int8)
     # Add short signal logic
-    dataframe['short_signal'] = (
-        dataframe['sweep_high'] &
-        (dataframe['rsi'] > 70) &
-        (dataframe['volume'] > dataframe['volume_ma_1D'])
-    )
+    dataframe['short_signal'] = short_signal.astype(np.int8)
     return dataframe
 
 def populate_entry_trend(self, dataframe, **kwargs):
-    dataframe.loc[
-        (
-            dataframe['short_signal'] &
-            (dataframe['high'] > dataframe['order_block_high']) &  # Price tests order block
-            (dataframe['volume'] > 0)
-        ),
-        'enter_short'] = 1
-
-    dataframe.loc[
-        (
-            dataframe['long_signal'] &
-            (dataframe['low'] < dataframe['order_block_low']) &  # Price tests order block
-            (dataframe['volume'] > 0)
-        ),
-        'enter_long'] = 1
-    
-    return dataframe
\ No newline at end of file
+    volume_ok = dataframe['volume'].to_numpy() > 0
+
+    enter_short = (
+        (dataframe['short_signal'].to_numpy() != 0) &
+        (dataframe['high'].to_numpy() > dataframe['order_block_high'].to_numpy()) &  # Price tests order block
+        volume_ok
+    )
+    dataframe['enter_short'] = np.where(enter_short, np.int8(1), np.int8(0))
+
+    enter_long = (
+        (dataframe['long_signal'].to_numpy() != 0) &
+        (dataframe['low'].to_numpy() < dataframe['order_block_low'].to_numpy()) &  # Price tests order block
+        volume_ok
+    )
+    dataframe['enter_long'] = np.where(enter_long, np.int8(1), np.int8(0))
+
+    return dataframe